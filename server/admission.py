@@ -0,0 +1,108 @@
+"""Connection admission and per-connection message rate limiting"""
+
+import asyncio
+import json
+import logging
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# WebSocket close code for "server overloaded, try again later" (RFC 6455 registry)
+CLOSE_TRY_AGAIN_LATER = 1013
+
+class AdmissionController:
+    """Caps the number of live transcription sessions.
+
+    Up to WS_MAX_CONNECTIONS sessions run at once. Past that, up to
+    WS_ADMISSION_QUEUE clients wait (at most WS_ADMISSION_TIMEOUT seconds)
+    for a session to end; anyone beyond that is turned away straight away
+    with a Retry-After hint, so a spike can't drag every session down.
+    """
+
+    def __init__(self, max_connections=None, max_waiting=None, wait_timeout=None):
+        self.max_connections = max_connections or Config.WS_MAX_CONNECTIONS
+        self.max_waiting = max_waiting if max_waiting is not None else Config.WS_ADMISSION_QUEUE
+        self.wait_timeout = wait_timeout if wait_timeout is not None else Config.WS_ADMISSION_TIMEOUT
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def full(self):
+        return self._slots.locked()
+
+    async def acquire(self):
+        """Wait for a session slot; False if the client should retry later"""
+        if self.full and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "max_connections": self.max_connections,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+async def reject_websocket(websocket, retry_after=None, message="Server is at capacity, try again later"):
+    """Tell an accepted client to come back later, then close with 1013"""
+    retry_after = retry_after or Config.RETRY_AFTER_SECONDS
+    try:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "code": "overloaded",
+            "message": message,
+            "retry_after": retry_after
+        }))
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=f"retry after {retry_after}s")
+    except Exception as e:
+        logger.debug(f"Client went away before rejection: {e}")
+
+class TokenBucket:
+    """Message rate limit for one connection: `rate` per second, bursts up to `burst`.
+
+    `take` never refuses a message; it returns how long the caller should
+    wait before handling it, so a client that sends too fast is slowed
+    down (through TCP backpressure) rather than losing audio.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate if rate is not None else Config.WS_RATE_LIMIT
+        self.burst = burst or Config.WS_RATE_BURST or self.rate
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.throttled = 0
+
+    def take(self):
+        """Spend a token; returns the delay in seconds before the message may be handled"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        self.throttled += 1
+        return -self.tokens / self.rate
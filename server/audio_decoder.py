@@ -0,0 +1,219 @@
+"""Long-lived ffmpeg decoders for compressed (Opus/WebM) client audio"""
+
+import asyncio
+import logging
+import queue
+import subprocess
+import threading
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Client audio formats and the ffmpeg demuxer for each; "pcm16" needs no decoder
+AUDIO_FORMATS = {
+    "pcm16": None,
+    "webm": "matroska",  # MediaRecorder's audio/webm;codecs=opus
+    "ogg": "ogg"  # audio/ogg;codecs=opus
+}
+
+# Until ffmpeg has produced this much audio, frames are costed at a nominal bitrate
+RATIO_MIN_SECONDS = 1.0
+# 24 kbps is at the low end for Opus speech, so the nominal estimate errs toward more audio, not less
+NOMINAL_BYTES_PER_SECOND = 3000
+
+class FFmpegDecoder:
+    """One ffmpeg process turning a compressed stream into 16 kHz mono int16.
+
+    The process lives for a whole client stream: bytes are written to its
+    stdin as they arrive and a reader thread collects decoded PCM, so no
+    process is started per message.
+    """
+
+    def __init__(self, audio_format, sample_rate=16000):
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.process = subprocess.Popen(
+            [
+                Config.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+                "-fflags", "nobuffer", "-probesize", "4096", "-analyzeduration", "0",
+                "-f", AUDIO_FORMATS[audio_format], "-i", "pipe:0",
+                "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        self.output = queue.Queue()
+        self.bytes_in = 0
+        self.samples_out = 0
+        self._reader = threading.Thread(target=self._read, name="ffmpeg-decoder", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        remainder = b""
+        while True:
+            data = self.process.stdout.read(8192)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % 2
+            remainder = data[usable:]
+            if usable:
+                self.output.put(np.frombuffer(data[:usable], dtype=np.int16))
+        self.output.put(None)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    async def feed(self, data):
+        """Write compressed bytes to the decoder without blocking the event loop"""
+        self.bytes_in += len(data)
+        # The pipe blocks whenever ffmpeg falls behind; callers await each feed, so writes stay in order
+        await asyncio.get_running_loop().run_in_executor(None, self.process.stdin.write, data)
+
+    def estimate_seconds(self, nbytes):
+        """Seconds of audio in `nbytes` of compressed input, from the ratio observed so far"""
+        if self.samples_out < RATIO_MIN_SECONDS * self.sample_rate:
+            return nbytes / NOMINAL_BYTES_PER_SECOND
+        return nbytes * self.samples_out / self.bytes_in / self.sample_rate
+
+    def read(self):
+        """Decoded PCM available so far (never blocks); None if nothing is ready"""
+        blocks = []
+        while True:
+            try:
+                block = self.output.get_nowait()
+            except queue.Empty:
+                break
+            if block is None:
+                break
+            blocks.append(block)
+        return self._join(blocks)
+
+    def finish(self, timeout=2.0):
+        """Close the input and return whatever PCM the decoder still had buffered"""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        blocks = []
+        while True:
+            try:
+                block = self.output.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if block is None:
+                break
+            blocks.append(block)
+        self.close()
+        return self._join(blocks)
+
+    def _join(self, blocks):
+        if not blocks:
+            return None
+        pcm = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        self.samples_out += len(pcm)
+        return pcm
+
+    def close(self):
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+
+class DecoderPool:
+    """Keeps ffmpeg decoders warm so a stream never waits for a process to start.
+
+    A session takes a decoder for the lifetime of its stream (a container
+    stream can't be shared); the pool replaces it in the background so
+    AUDIO_DECODER_POOL_SIZE spares of the default format are always ready.
+    """
+
+    def __init__(self, size=None, warm_format=None):
+        self.size = size if size is not None else Config.AUDIO_DECODER_POOL_SIZE
+        self.warm_format = warm_format or Config.AUDIO_DECODER_WARM_FORMAT
+        self._spares = []
+        self._lock = threading.Lock()
+        self._refilling = False
+        self.active = 0
+        self.started = 0
+        self.available = True
+
+    def start(self):
+        """Spawn the first spares; disables compressed input if ffmpeg is missing"""
+        try:
+            self._refill()
+        except FileNotFoundError:
+            self.available = False
+            logger.warning(f"{Config.FFMPEG_BINARY} not found; only pcm16 audio will be accepted")
+            return
+        logger.info(f"Audio decoder pool started ({self.size} warm {self.warm_format} decoders)")
+
+    def _spawn(self, audio_format):
+        self.started += 1
+        return FFmpegDecoder(audio_format)
+
+    def _refill(self):
+        with self._lock:
+            # One refill at a time; the running one re-checks after every spawn
+            if self._refilling:
+                return
+            self._refilling = True
+        try:
+            while True:
+                with self._lock:
+                    self._spares = [d for d in self._spares if d.alive]
+                    if len(self._spares) >= self.size:
+                        return
+                decoder = self._spawn(self.warm_format)
+                with self._lock:
+                    self._spares.append(decoder)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def acquire(self, audio_format):
+        """A decoder for a new stream of `audio_format`"""
+        if not self.available:
+            raise RuntimeError("Compressed audio is not available (ffmpeg not found)")
+        decoder = None
+        if audio_format == self.warm_format:
+            with self._lock:
+                while self._spares and decoder is None:
+                    spare = self._spares.pop()
+                    decoder = spare if spare.alive else None
+        if decoder is None:
+            decoder = self._spawn(audio_format)
+        self.active += 1
+        # Top the spares back up off the request path
+        threading.Thread(target=self._refill, name="ffmpeg-decoder-refill", daemon=True).start()
+        return decoder
+
+    def release(self, decoder):
+        """End a stream's decoder"""
+        self.active -= 1
+        decoder.close()
+
+    def shutdown(self):
+        with self._lock:
+            spares, self._spares = self._spares, []
+        for decoder in spares:
+            decoder.close()
+
+    def stats(self):
+        return {
+            "available": self.available,
+            "warm_format": self.warm_format,
+            "spares": len(self._spares),
+            "active": self.active,
+            "processes_started": self.started
+        }
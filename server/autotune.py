@@ -0,0 +1,158 @@
+"""Benchmark compute type, CPU threads and parallel decodes on this host and cache the winner"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_buffer import synthetic_speech
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Compute types worth benchmarking per device (only those CTranslate2 supports here are tried)
+COMPUTE_TYPE_CANDIDATES = {
+    "cuda": ["float16", "int8_float16", "bfloat16"],
+    "cpu": ["int8", "float32"]
+}
+
+def _cache_key(model_kwargs, processes, cores):
+    import ctranslate2
+
+    return (
+        f"{model_kwargs['model_size_or_path']}|{model_kwargs['device']}|{Config.COMPUTE_TYPE}|"
+        f"{cores} cores|{processes} processes|ctranslate2 {ctranslate2.__version__}|"
+        f"{Config.AUTOTUNE_CLIP_SECONDS}s clip|{Config.AUTOTUNE_LATENCY_TARGET}s target"
+    )
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable autotune cache {path}: {e}")
+        return {}
+
+def _write_cache(path, cache):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.warning(f"Could not write autotune cache {path}: {e}")
+
+def _measure(model_kwargs, audio, options):
+    """Load one candidate; returns (latency of one decode, seconds of audio decoded per second in parallel)"""
+    from faster_whisper import WhisperModel
+
+    model = WhisperModel(**model_kwargs)
+
+    def decode(_=None):
+        segments, _ = model.transcribe(audio, **options)
+        for _ in segments:
+            pass
+
+    decode()  # first decode pays for lazy initialization
+    started = time.perf_counter()
+    decode()
+    latency = time.perf_counter() - started
+
+    # Keep every decode worker busy twice over
+    clips = 2 * max(1, model_kwargs.get("num_workers", 1))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clips // 2) as pool:
+        list(pool.map(decode, range(clips)))
+    throughput = clips * len(audio) / SAMPLE_RATE / (time.perf_counter() - started)
+    return latency, throughput
+
+def _pick(trials):
+    """Highest throughput within the latency target, else the lowest latency"""
+    within = [t for t in trials if t["latency"] <= Config.AUTOTUNE_LATENCY_TARGET]
+    if within:
+        return max(within, key=lambda t: t["throughput"])
+    return min(trials, key=lambda t: t["latency"])
+
+def _benchmark(model_kwargs, processes, cores):
+    import ctranslate2
+
+    device = model_kwargs["device"]
+    cores = max(1, cores // processes)
+    audio = synthetic_speech(Config.AUTOTUNE_CLIP_SECONDS)
+    options = {"language": "en", "beam_size": Config.LIVE_BEAM_SIZE, "vad_filter": False}
+
+    if Config.COMPUTE_TYPE != "auto":
+        compute_types = [model_kwargs["compute_type"]]
+    else:
+        supported = set(ctranslate2.get_supported_compute_types(device))
+        compute_types = [ct for ct in COMPUTE_TYPE_CANDIDATES.get(device, []) if ct in supported]
+        compute_types = compute_types or [model_kwargs["compute_type"]]
+    # cpu_threads only matters on the CPU; 0 keeps CTranslate2's default
+    thread_counts = sorted({cores, max(1, cores // 2), max(1, cores // 4)}, reverse=True) if device == "cpu" else [0]
+    worker_counts = sorted({1, 2, Config.MODEL_NUM_WORKERS})
+
+    trials = []
+
+    def trial(compute_type, cpu_threads, num_workers):
+        candidate = {"compute_type": compute_type, "cpu_threads": cpu_threads, "num_workers": num_workers}
+        try:
+            latency, throughput = _measure(dict(model_kwargs, **candidate), audio, options)
+        except Exception as e:
+            logger.warning(f"Autotune candidate {candidate} failed: {e}")
+            return
+        candidate.update(latency=round(latency, 3), throughput=round(throughput, 2))
+        trials.append(candidate)
+        logger.info(f"Autotune {compute_type}, {cpu_threads} threads, {num_workers} workers: "
+                    f"{latency:.2f}s latency, {throughput:.1f}s audio/s")
+
+    # Pass 1: the compute type, one decode on all cores
+    for compute_type in compute_types:
+        trial(compute_type, thread_counts[0], 1)
+    if not trials:
+        raise RuntimeError("every autotune candidate failed")
+    compute_type = _pick(trials)["compute_type"]
+
+    # Pass 2: split those cores between parallel decodes
+    for num_workers in worker_counts:
+        for cpu_threads in thread_counts:
+            if (cpu_threads, num_workers) == (thread_counts[0], 1):
+                continue
+            if device == "cpu" and cpu_threads * num_workers > cores:
+                continue
+            trial(compute_type, cpu_threads, num_workers)
+
+    return dict(_pick(trials), measured_at=time.time(), trials=trials)
+
+def calibrate(model_kwargs, processes=1, cores=None):
+    """Tuned compute_type / cpu_threads / num_workers for `model_kwargs` on this host.
+
+    Benchmarks the candidates with a synthetic clip the first time and
+    stores the choice in the cache file (AUTOTUNE_CACHE, by default
+    autotune.json next to the models), so later boots on the same host,
+    model and CTranslate2 version reuse it. `processes` is the number of
+    model replicas sharing the `cores` set aside for inference (process
+    executor). Returns the chosen settings plus their measured latency
+    and throughput.
+    """
+    cores = cores or os.cpu_count() or 1
+    path = Config.AUTOTUNE_CACHE or os.path.join(model_kwargs.get("download_root") or ".", "autotune.json")
+    key = _cache_key(model_kwargs, processes, cores)
+    cache = _read_cache(path)
+    if key in cache:
+        logger.info(f"Using cached tuning from {path}")
+        return cache[key]
+
+    logger.info(f"Calibrating Whisper settings for {key}...")
+    started = time.perf_counter()
+    result = _benchmark(model_kwargs, processes, cores)
+    logger.info(f"Calibration picked {result['compute_type']}, {result['cpu_threads']} threads, "
+                f"{result['num_workers']} workers in {time.perf_counter() - started:.1f}s")
+    cache[key] = result
+    _write_cache(path, cache)
+    return result
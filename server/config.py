@@ -10,15 +10,93 @@ class Config:
     AUDIO_CHUNK_SIZE = int(os.getenv('AUDIO_CHUNK_SIZE', 1024))
     AUDIO_BUFFER_MAX_SIZE = int(os.getenv('AUDIO_BUFFER_MAX_SIZE', 50 * 1024 * 1024))  # 50MB
     AUDIO_SAMPLE_RATE = int(os.getenv('AUDIO_SAMPLE_RATE', 16000))
+    AUDIO_RING_HEADROOM = float(os.getenv('AUDIO_RING_HEADROOM', 1.0))  # seconds the per-session ring holds beyond one chunk / the longest window
     
     # Model settings
     MODEL_SIZE = os.getenv('WHISPER_MODEL_SIZE', 'base')
     DEVICE = os.getenv('WHISPER_DEVICE', 'auto')  # auto, cpu, cuda
-    COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', 'float16')  # float16, int8, int16
+    COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', 'auto')  # auto (float16 on GPU, int8 on CPU), float16, int8, int8_float16, ...
+    WHISPER_MODELS = os.getenv('WHISPER_MODELS', 'tiny,base,small,medium,large-v3')  # sizes clients and jobs may ask for
+    MODEL_MEMORY_BUDGET_MB = int(os.getenv('MODEL_MEMORY_BUDGET_MB', 4096))  # least recently used models are unloaded past this
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'  # decode synthetic speech before reporting ready
+    WARMUP_SECONDS = float(os.getenv('WARMUP_SECONDS', 2.0))
+    # Startup calibration of compute type, CPU threads and parallel decodes (see autotune.py)
+    AUTOTUNE_ENABLED = os.getenv('AUTOTUNE_ENABLED', 'false').lower() == 'true'
+    AUTOTUNE_CACHE = os.getenv('AUTOTUNE_CACHE', '')  # defaults to autotune.json in the models directory
+    AUTOTUNE_CLIP_SECONDS = float(os.getenv('AUTOTUNE_CLIP_SECONDS', 5.0))
+    AUTOTUNE_LATENCY_TARGET = float(os.getenv('AUTOTUNE_LATENCY_TARGET', 1.0))  # max seconds to decode one clip
     
     # Performance settings
-    BATCH_SIZE = int(os.getenv('TRANSCRIPTION_BATCH_SIZE', 4))
+    BATCH_SIZE = int(os.getenv('TRANSCRIPTION_BATCH_SIZE', 4))  # max chunks decoded together
+    BATCH_WINDOW_MS = int(os.getenv('TRANSCRIPTION_BATCH_WINDOW_MS', 100))  # how long to wait for a batch to fill
     MAX_CONCURRENT_TRANSCRIPTIONS = int(os.getenv('MAX_CONCURRENT_TRANSCRIPTIONS', 10))
+    INFERENCE_EXECUTOR = os.getenv('INFERENCE_EXECUTOR', 'thread')  # thread, process
+    MODEL_NUM_WORKERS = int(os.getenv('WHISPER_NUM_WORKERS', 2))  # parallel decodes inside one WhisperModel
+    MODEL_WORKER_PROCESSES = int(os.getenv('WHISPER_WORKER_PROCESSES', 2))  # model replicas in process mode
+    WORKER_SLOTS = int(os.getenv('WHISPER_WORKER_SLOTS', 8))  # shared-memory audio slots per worker process
+    WORKER_SLOT_SECONDS = float(os.getenv('WHISPER_WORKER_SLOT_SECONDS', 60))
+    WORKER_MAX_RESTARTS = int(os.getenv('WHISPER_WORKER_MAX_RESTARTS', 3))  # respawns before a crashed worker is given up on
+    # CPU split between model replicas, summarization and I/O (see thread_budget.py)
+    CPU_CORES = int(os.getenv('CPU_CORES', 0))  # 0 = detect from the affinity mask and cgroup quota
+    SUMMARY_THREADS = int(os.getenv('SUMMARY_THREADS', 1))  # BLAS threads for summaries, which run one at a time
+    IO_THREADS = int(os.getenv('IO_THREADS', 1))  # cores kept for the event loop, VAD and ffmpeg
+    
+    # Compressed client audio (Opus in WebM/Ogg), decoded by long-lived ffmpeg processes
+    FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+    AUDIO_DECODER_POOL_SIZE = int(os.getenv('AUDIO_DECODER_POOL_SIZE', 2))  # warm spare decoders
+    AUDIO_DECODER_WARM_FORMAT = os.getenv('AUDIO_DECODER_WARM_FORMAT', 'webm')
+    
+    # Adaptive chunking: cut chunks at quiet points instead of fixed windows
+    FIRST_CHUNK_SECONDS = float(os.getenv('FIRST_CHUNK_SECONDS', 2.0))  # short first chunk for fast first text
+    CHUNK_MIN_SECONDS = float(os.getenv('CHUNK_MIN_SECONDS', 1.5))  # never cut earlier than this
+    CHUNK_MAX_SECONDS = float(os.getenv('CHUNK_MAX_SECONDS', 15.0))  # always cut by this, silence or not
+    CHUNK_OVERLAP_SECONDS = float(os.getenv('CHUNK_OVERLAP_SECONDS', 0.5))  # re-decoded when a cut has to go through speech
+    CHUNK_SILENCE_RMS = float(os.getenv('CHUNK_SILENCE_RMS', 300))  # int16 RMS below which a frame counts as a pause
+    CHUNK_GROW_RTF = float(os.getenv('CHUNK_GROW_RTF', 0.3))  # grow chunks while decoding is this much faster than real time
+    CHUNK_SHRINK_RTF = float(os.getenv('CHUNK_SHRINK_RTF', 0.8))  # shrink them when decoding falls behind
+    
+    # Two-pass transcription: greedy live drafts, refined in the background
+    LIVE_BEAM_SIZE = int(os.getenv('LIVE_BEAM_SIZE', 1))
+    REFINE_ENABLED = os.getenv('REFINE_ENABLED', 'true').lower() == 'true'
+    REFINE_BEAM_SIZE = int(os.getenv('REFINE_BEAM_SIZE', 5))
+    REFINE_QUEUE_SIZE = int(os.getenv('REFINE_QUEUE_SIZE', 32))  # oldest drafts stay unrefined past this
+    REFINE_FLUSH_TIMEOUT = float(os.getenv('REFINE_FLUSH_TIMEOUT', 10.0))  # wait for refinements before summarizing
+    
+    # Load-adaptive quality ladder for live sessions (see qos.py)
+    QOS_ENABLED = os.getenv('QOS_ENABLED', 'true').lower() == 'true'
+    QOS_INTERVAL = float(os.getenv('QOS_INTERVAL', 1.0))  # seconds between load checks
+    QOS_STEP_DOWN_RTF = float(os.getenv('QOS_STEP_DOWN_RTF', 0.9))  # step down while live decodes take this long per second of audio
+    QOS_STEP_UP_RTF = float(os.getenv('QOS_STEP_UP_RTF', 0.4))  # step back up once they are this fast again
+    QOS_STEP_DOWN_QUEUE = int(os.getenv('QOS_STEP_DOWN_QUEUE', 8))  # ...or while this many decodes wait for a slot
+    QOS_STEP_UP_QUEUE = int(os.getenv('QOS_STEP_UP_QUEUE', 1))
+    QOS_DOWN_HOLD = float(os.getenv('QOS_DOWN_HOLD', 3.0))  # seconds of overload per step down
+    QOS_UP_HOLD = float(os.getenv('QOS_UP_HOLD', 15.0))  # seconds of headroom per step up
+    QOS_FALLBACK_MODEL = os.getenv('QOS_FALLBACK_MODEL', 'base')  # model live sessions drop to on the "small_model" rung
+    
+    # Word timestamps make chunk stitching exact but take live chunks out of cross-session batches.
+    # Off by default: chunks are cut at pauses, so segment-level stitching rarely splits a word.
+    WORD_TIMESTAMPS = os.getenv('WORD_TIMESTAMPS', 'false').lower() == 'true'
+    
+    # Voice activity gating: silent chunks never reach the model
+    VAD_GATING = os.getenv('VAD_GATING', 'true').lower() == 'true'
+    VAD_AGGRESSIVENESS = int(os.getenv('VAD_AGGRESSIVENESS', 2))  # webrtcvad mode, 0-3
+    VAD_FRAME_MS = int(os.getenv('VAD_FRAME_MS', 30))  # webrtcvad accepts 10, 20 or 30 ms frames
+    VAD_MIN_SPEECH_FRAMES = int(os.getenv('VAD_MIN_SPEECH_FRAMES', 3))  # voiced frames needed to decode a chunk
+    
+    # Streaming (partial hypothesis) settings, overridable per session
+    STREAMING_DEFAULT = os.getenv('STREAMING_DEFAULT', 'false').lower() == 'true'
+    PARTIAL_INTERVAL = float(os.getenv('PARTIAL_INTERVAL', 1.0))  # seconds of new audio between partial decodes
+    COMMIT_AGREEMENT = int(os.getenv('COMMIT_AGREEMENT', 2))  # hypotheses that must agree before text is final
+    STREAMING_MAX_WINDOW = float(os.getenv('STREAMING_MAX_WINDOW', 15.0))  # force a commit past this much audio
+    
+    # Batch file transcription jobs
+    JOB_CHUNK_SECONDS = float(os.getenv('JOB_CHUNK_SECONDS', 25.0))  # target chunk length, cut at a pause
+    JOB_MAX_CHUNK_SECONDS = float(os.getenv('JOB_MAX_CHUNK_SECONDS', 30.0))  # one Whisper window
+    JOB_PARALLEL_CHUNKS = int(os.getenv('JOB_PARALLEL_CHUNKS', 8))  # chunks of one job decoding at once
+    JOB_BEAM_SIZE = int(os.getenv('JOB_BEAM_SIZE', 5))
+    MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', 2))
+    MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 20))  # uploads beyond this get 503 + Retry-After
+    JOB_DIR = os.getenv('JOB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs'))  # uploads and checkpoints
     
     # Cache settings
     CACHE_SIZE = int(os.getenv('TRANSCRIPTION_CACHE_SIZE', 1000))
@@ -27,6 +105,20 @@ class Config:
     # WebSocket settings
     WS_MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', 100))
     WS_RATE_LIMIT = int(os.getenv('WS_RATE_LIMIT', 10))  # messages per second
+    WS_RATE_BURST = int(os.getenv('WS_RATE_BURST', 20))  # messages a client may send back to back
+    WS_ADMISSION_QUEUE = int(os.getenv('WS_ADMISSION_QUEUE', 10))  # clients allowed to wait for a free session
+    WS_ADMISSION_TIMEOUT = float(os.getenv('WS_ADMISSION_TIMEOUT', 10.0))  # seconds a waiting client waits before being turned away
+    RETRY_AFTER_SECONDS = int(os.getenv('RETRY_AFTER_SECONDS', 30))  # Retry-After given to clients turned away when full
+    INBOUND_MAX_SECONDS = float(os.getenv('INBOUND_MAX_SECONDS', 20.0))  # audio queued per session before reads pause
+    INBOUND_COALESCE_LAG = float(os.getenv('INBOUND_COALESCE_LAG', 2.0))  # lag (s) at which queued audio is decoded in one go
+    INBOUND_DEGRADE_LAG = float(os.getenv('INBOUND_DEGRADE_LAG', 5.0))  # lag (s) at which cheaper decodes kick in
+    INBOUND_SLOW_DOWN_LAG = float(os.getenv('INBOUND_SLOW_DOWN_LAG', 10.0))  # lag (s) at which the client is told to slow down
+    WS_OUTBOUND_MAX_MESSAGES = int(os.getenv('WS_OUTBOUND_MAX_MESSAGES', 64))  # results queued per client before it counts as stalled
+    WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', 10.0))  # seconds a single send may take before the client counts as gone
+    FLOW_REPORT_INTERVAL = float(os.getenv('FLOW_REPORT_INTERVAL', 1.0))  # seconds between flow messages while behind
+    
+    # Admin endpoints (model hot swap) are disabled unless this is set; requests must carry it in X-Admin-Token
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -39,5 +131,6 @@ class Config:
             'model_size': cls.MODEL_SIZE,
             'device': cls.DEVICE,
             'compute_type': cls.COMPUTE_TYPE,
-            'batch_size': cls.BATCH_SIZE
+            'batch_size': cls.BATCH_SIZE,
+            'batch_window_ms': cls.BATCH_WINDOW_MS
         }
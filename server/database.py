@@ -1,11 +1,8 @@
-import pymongo
-import gridfs
-from pymongo import MongoClient
 import os
+import threading
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 import logging
-from bson import ObjectId
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,21 +14,51 @@ class DatabaseManager:
         self.connection_string = os.getenv("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017/")
         self.database_name = os.getenv("MONGODB_DATABASE_NAME", "meeting_transcriber")
         
-        try:
-            # Create MongoDB client
-            self.client = MongoClient(self.connection_string)
-            self.db = self.client[self.database_name]
-            self.meetings_collection = self.db.meetings
-            self.fs = gridfs.GridFS(self.db)
-            
-            # Create indexes for better query performance
-            self.meetings_collection.create_index("meeting_id", unique=True)
-            self.meetings_collection.create_index("created_at")
-            
-            logger.info("Connected to MongoDB successfully")
-        except Exception as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
-            raise
+        # Connected on first use, so importing this module neither blocks on MongoDB nor needs it running
+        self.client = None
+        self.db = None
+        self._meetings_collection = None
+        self._fs = None
+        self._connect_lock = threading.Lock()
+
+    def _connect(self):
+        """Open the MongoDB connection and create indexes (once)"""
+        with self._connect_lock:
+            if self.client is not None:
+                return
+            import gridfs
+            from pymongo import MongoClient
+
+            try:
+                # Create MongoDB client
+                client = MongoClient(self.connection_string)
+                db = client[self.database_name]
+                meetings_collection = db.meetings
+                
+                # Create indexes for better query performance
+                meetings_collection.create_index("meeting_id", unique=True)
+                meetings_collection.create_index("created_at")
+                
+                self.db = db
+                self._meetings_collection = meetings_collection
+                self._fs = gridfs.GridFS(db)
+                self.client = client
+                logger.info("Connected to MongoDB successfully")
+            except Exception as e:
+                logger.error(f"Failed to connect to MongoDB: {e}")
+                raise
+
+    @property
+    def meetings_collection(self):
+        if self.client is None:
+            self._connect()
+        return self._meetings_collection
+
+    @property
+    def fs(self):
+        if self.client is None:
+            self._connect()
+        return self._fs
 
     def save_meeting(self, meeting_data: Dict[str, Any]) -> str:
         """
@@ -104,6 +131,8 @@ class DatabaseManager:
         :param file_id: File ID
         :return: Audio file data or None if not found
         """
+        from bson import ObjectId
+
         try:
             oid = ObjectId(file_id)
             file_data = self.fs.get(oid)
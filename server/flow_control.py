@@ -0,0 +1,140 @@
+"""Bounded inbound queue and catch-up policy for websocket audio"""
+
+import asyncio
+import time
+from collections import deque
+
+from config import Config
+
+# Flow states, in order of how far behind the session is
+NORMAL = "normal"
+COALESCE = "coalesce"  # decode everything buffered as one long chunk
+DEGRADE = "degrade"  # also drop word timestamps and Silero VAD
+SLOW_DOWN = "slow_down"  # also ask the client to send less
+
+class InboundQueue:
+    """Frames received from a client but not yet processed.
+
+    A reader task fills the queue while the session works through it, so
+    the socket is always being drained. The queue is bounded by seconds
+    of audio: once INBOUND_MAX_SECONDS are waiting the reader stops
+    reading, which pushes back on the client through TCP. The age of the
+    oldest waiting frame is the session's lag, and it picks the flow state.
+    """
+
+    def __init__(self, session, max_seconds=None):
+        self.session = session
+        self.max_seconds = max_seconds or Config.INBOUND_MAX_SECONDS
+        self._frames = deque()  # (received_at, message, seconds)
+        self._seconds = 0.0
+        self._changed = asyncio.Condition()
+        self.state = NORMAL
+        self._last_report = 0.0
+        # Backlog as it stood when the last message was taken off the queue
+        self._taken_lag = 0.0
+        self._taken_seconds = 0.0
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def queued_seconds(self):
+        return self._seconds
+
+    @property
+    def lag_seconds(self):
+        if not self._frames:
+            return 0.0
+        return time.monotonic() - self._frames[0][0]
+
+    async def put(self, message):
+        """Queue a received message, waiting while the queue is full"""
+        seconds = self.session.estimate_seconds(message.get("bytes"))
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._seconds < self.max_seconds or not self._frames)
+            self._frames.append((time.monotonic(), message, seconds))
+            self._seconds += seconds
+            self._changed.notify_all()
+
+    async def close(self):
+        """Mark the end of input (the client disconnected)"""
+        async with self._changed:
+            self._frames.append((time.monotonic(), None, 0.0))
+            self._changed.notify_all()
+
+    async def abort(self):
+        """Drop whatever is queued and end input now (the client stopped reading)"""
+        async with self._changed:
+            self._frames.clear()
+            self._seconds = 0.0
+            self._frames.append((time.monotonic(), None, 0.0))
+            self._changed.notify_all()
+
+    async def get(self):
+        """Next message; consecutive audio frames are coalesced into one"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._frames)
+            received_at, message, seconds = self._frames.popleft()
+            self._taken_lag = time.monotonic() - received_at
+            self._taken_seconds = self._seconds
+            self._seconds -= seconds
+            if message is not None and message.get("bytes") is not None:
+                parts = [message["bytes"]]
+                # What piled up behind this frame goes into the same decode, as far as the session's buffer can take it
+                room = self.session.free_seconds() - seconds
+                while (self._frames and self._frames[0][1] is not None and self._frames[0][1].get("bytes") is not None
+                       and self._frames[0][2] <= room):
+                    _, queued, queued_seconds = self._frames.popleft()
+                    self._seconds -= queued_seconds
+                    room -= queued_seconds
+                    parts.append(queued["bytes"])
+                if len(parts) > 1:
+                    message = {"type": message["type"], "bytes": b"".join(parts)}
+            self._changed.notify_all()
+            return message
+
+    def update_state(self):
+        """Re-evaluate the flow state; returns a "flow" message for the client when it should hear about it"""
+        lag = max(self._taken_lag, self.lag_seconds)
+        queued = max(self._taken_seconds, self._seconds)
+        if lag >= Config.INBOUND_SLOW_DOWN_LAG or queued >= self.max_seconds:
+            state = SLOW_DOWN
+        elif lag >= Config.INBOUND_DEGRADE_LAG:
+            state = DEGRADE
+        elif lag >= Config.INBOUND_COALESCE_LAG:
+            state = COALESCE
+        else:
+            state = NORMAL
+
+        self.session.catch_up = state != NORMAL
+        self.session.degraded = state in (DEGRADE, SLOW_DOWN)
+
+        now = time.monotonic()
+        changed = state != self.state
+        self.state = state
+        if not changed and (state == NORMAL or now - self._last_report < Config.FLOW_REPORT_INTERVAL):
+            return None
+        self._last_report = now
+        return {
+            "type": "flow",
+            "state": state,
+            "queue_depth": len(self._frames),
+            "queued_seconds": round(queued, 2),
+            "lag_seconds": round(lag, 2)
+        }
+
+async def receive_frames(websocket, inbound, limiter=None):
+    """Reader task: move messages from the socket into the inbound queue"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if limiter is not None:
+                # Over the message rate: stop reading for a moment instead of dropping audio
+                delay = limiter.take()
+                if delay:
+                    await asyncio.sleep(delay)
+            await inbound.put(message)
+    finally:
+        await inbound.close()
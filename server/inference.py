@@ -0,0 +1,497 @@
+"""Run Whisper decodes off the event loop in a bounded worker pool"""
+
+import asyncio
+import contextlib
+import logging
+import threading
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_buffer import synthetic_speech
+from config import Config
+from model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# Segment produced by a batched decode (same fields the servers read from faster-whisper)
+DecodedSegment = namedtuple("DecodedSegment", ["start", "end", "text", "words", "no_speech_prob"])
+
+SAMPLE_RATE = 16000
+MAX_BATCH_CLIP_SECONDS = 30.0  # one Whisper window per batch entry
+NO_SPEECH_THRESHOLD = 0.6
+
+# Marks the end of a streamed decode
+STREAM_END = object()
+
+def _decode(model, audio, options):
+    """Run a blocking decode and consume faster-whisper's lazy segment generator"""
+    segments, _ = model.transcribe(audio, **options)
+    return list(segments)
+
+def _decode_iter(model, audio, options, stop):
+    """Yield segments one at a time as faster-whisper decodes them"""
+    segments, _ = model.transcribe(audio, **options)
+    for segment in segments:
+        if stop.is_set():
+            break
+        yield segment
+
+def _decode_batch(model, audios, options):
+    """Decode several short clips with one encoder pass and one generate call.
+
+    faster-whisper only transcribes one file at a time, so this goes straight
+    to the underlying CTranslate2 model. Each clip fills a single 30 s window;
+    unless `without_timestamps` is set its timestamp tokens are split into
+    segments, otherwise it yields at most one segment spanning the clip.
+    Silent clips are dropped by the no-speech probability instead of Silero VAD.
+    """
+    import ctranslate2
+    from faster_whisper.tokenizer import Tokenizer
+
+    tokenizer = Tokenizer(
+        model.hf_tokenizer,
+        model.model.is_multilingual,
+        task="transcribe",
+        language=options.get("language") or "en"
+    )
+
+    time_precision = getattr(model, "time_precision", 0.02)
+    n_frames = model.feature_extractor.nb_max_frames
+    features = []
+    for audio in audios:
+        mel = model.feature_extractor(audio)[:, :n_frames]
+        if mel.shape[-1] < n_frames:
+            mel = np.pad(mel, ((0, 0), (0, n_frames - mel.shape[-1])))
+        features.append(mel)
+    features = np.ascontiguousarray(np.stack(features), dtype=np.float32)
+    encoder_output = model.model.encode(ctranslate2.StorageView.from_array(features))
+
+    with_timestamps = not options.get("without_timestamps", False)
+    prompt = list(tokenizer.sot_sequence)
+    if not with_timestamps:
+        prompt.append(tokenizer.no_timestamps)
+    beam_size = options.get("beam_size", 5)
+    temperature = options.get("temperature", 0.0)
+    if isinstance(temperature, (list, tuple)):
+        temperature = temperature[0]
+    if temperature > 0:
+        # Same choice faster-whisper makes: sample best_of hypotheses instead of beam search
+        decode_kwargs = {
+            "beam_size": 1,
+            "num_hypotheses": options.get("best_of", 5),
+            "sampling_topk": 0,
+            "sampling_temperature": temperature
+        }
+    else:
+        decode_kwargs = {"beam_size": beam_size}
+
+    results = model.model.generate(
+        encoder_output,
+        [prompt] * len(audios),
+        max_length=getattr(model, "max_length", 448),
+        return_scores=True,
+        return_no_speech_prob=True,
+        max_initial_timestamp_index=50,
+        suppress_blank=True,
+        suppress_tokens=[-1],
+        **decode_kwargs
+    )
+
+    decoded = []
+    for audio, result in zip(audios, results):
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD:
+            decoded.append([])
+            continue
+        best = max(range(len(result.sequences_ids)), key=lambda i: result.scores[i])
+        duration = len(audio) / SAMPLE_RATE
+        segments = []
+        for start, end, tokens in _split_by_timestamps(tokenizer, result.sequences_ids[best], duration, time_precision):
+            text = tokenizer.decode(tokens)
+            if text.strip():
+                segments.append(DecodedSegment(start, end, text, None, result.no_speech_prob))
+        decoded.append(segments)
+    return decoded
+
+def _split_by_timestamps(tokenizer, tokens, duration, time_precision):
+    """Split a generated sequence into (start, end, text tokens) at its timestamp tokens"""
+    spans = []
+    start = None
+    text = []
+    for token in tokens:
+        if token < tokenizer.eot:
+            text.append(token)
+        elif token >= tokenizer.timestamp_begin:
+            time = min((token - tokenizer.timestamp_begin) * time_precision, duration)
+            if text:
+                spans.append((start if start is not None else 0.0, time, text))
+                start, text = None, []
+            else:
+                start = time
+    if text:
+        spans.append((start if start is not None else 0.0, duration, text))
+    return spans
+
+def warm_up(model, seconds=None):
+    """Run synthetic speech through the single and batched decode paths of `model`.
+
+    The first decode on a fresh model pays for CTranslate2 allocations,
+    the Silero VAD model and word alignment; doing that here keeps it off
+    the first real session, at startup and after a model swap.
+    """
+    audio = synthetic_speech(seconds or Config.WARMUP_SECONDS)
+    _decode(model, audio, {
+        "language": "en",
+        "beam_size": Config.LIVE_BEAM_SIZE,
+        "vad_filter": True,
+        "word_timestamps": True
+    })
+    _decode_batch(model, [audio, audio], {"language": "en", "beam_size": 1})
+
+def create_executor(kind=None):
+    """Build the inference backend selected by Config.INFERENCE_EXECUTOR"""
+    kind = (kind or Config.INFERENCE_EXECUTOR).lower()
+    if kind == "thread":
+        return InferenceExecutor()
+    if kind == "process":
+        from worker_pool import ModelWorkerPool
+        return ModelWorkerPool()
+    raise ValueError(f"Unknown inference executor: {kind}")
+
+class InferenceExecutor:
+    """Bounded thread pool that keeps decodes off the event loop.
+
+    All threads share the loaded WhisperModels; CTranslate2 releases the GIL
+    while decoding, so the loop stays responsive. A decode can name another
+    model (see ModelRegistry); it is loaded on the worker thread the first
+    time it is used.
+    """
+
+    kind = "thread"
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or Config.MAX_CONCURRENT_TRANSCRIPTIONS
+        self.models = None
+        self.model = None
+        self.ready = False
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor = None
+
+    def start(self, model_kwargs):
+        """Load the default model and create the pool around it"""
+        self.models = ModelRegistry(model_kwargs, warm_up=warm_up)
+        self.model = self.models.get()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="whisper-inference"
+        )
+        self.ready = True
+        logger.info(f"Inference executor started ({self.kind}, {self.max_workers} workers)")
+
+    # Session affinity only matters for the multi-process pool
+    def pin(self, session_id):
+        return None
+
+    def release(self, session_id):
+        pass
+
+    def route(self, session_id):
+        return None
+
+    async def transcribe(self, audio, worker=None, model=None, **options):
+        """Decode `audio` in the pool and return the list of segments"""
+        return await self._run(_decode, 1, model, audio, options)
+
+    async def transcribe_batch(self, audios, worker=None, model=None, **options):
+        """Decode several clips together; returns one segment list per clip"""
+        return await self._run(_decode_batch, len(audios), model, audios, options)
+
+    async def transcribe_stream(self, audio, worker=None, model=None, **options):
+        """Decode `audio` in the pool, yielding each segment as soon as it is produced"""
+        if not self.ready:
+            raise RuntimeError("Inference executor not started")
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            error = None
+            try:
+                for segment in _decode_iter(self.models.get(model), audio, options, stop):
+                    loop.call_soon_threadsafe(queue.put_nowait, (segment, None))
+            except Exception as e:
+                error = e
+            loop.call_soon_threadsafe(queue.put_nowait, (STREAM_END, error))
+
+        with self._pending_lock:
+            self.pending += 1
+        try:
+            producer = loop.run_in_executor(self._executor, produce)
+            while True:
+                segment, error = await queue.get()
+                if segment is STREAM_END:
+                    if error:
+                        raise error
+                    break
+                yield segment
+            await producer
+        finally:
+            # Consumer gone early: let the worker thread stop at the next segment
+            stop.set()
+            with self._pending_lock:
+                self.pending -= 1
+
+    def _call(self, func, model, *args):
+        # Runs on the worker thread, so loading a model never blocks the loop
+        return func(self.models.get(model), *args)
+
+    async def _run(self, func, count, model, *args):
+        if not self.ready:
+            raise RuntimeError("Inference executor not started")
+
+        loop = asyncio.get_running_loop()
+        with self._pending_lock:
+            self.pending += count
+        try:
+            return await loop.run_in_executor(self._executor, self._call, func, model, *args)
+        finally:
+            with self._pending_lock:
+                self.pending -= count
+
+    async def warm_up(self):
+        """Warm up the default model on a worker thread"""
+        await self._run(warm_up, 1, None)
+
+    async def preload(self, spec):
+        """Load and warm up a non-default model now and keep it loaded"""
+        if not self.ready:
+            raise RuntimeError("Inference executor not started")
+        await asyncio.to_thread(self.models.preload, spec)
+
+    async def swap_model(self, spec):
+        """Load, warm up and switch to a new default model; running decodes finish on the old one"""
+        if not self.ready:
+            raise RuntimeError("Inference executor not started")
+        self.model = await asyncio.to_thread(self.models.swap_default, spec)
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "pending": self.pending,
+            "models": self.models.stats() if self.models is not None else None
+        }
+
+    def shutdown(self):
+        """Stop accepting work and release the workers"""
+        self.ready = False
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+class _BatchRequest:
+    __slots__ = ("audio", "options", "worker", "model", "future")
+
+    def __init__(self, audio, options, worker, model, future):
+        self.audio = audio
+        self.options = options
+        self.worker = worker
+        self.model = model
+        self.future = future
+
+class BatchScheduler:
+    """Collects ready chunks from every session and decodes them in micro-batches.
+
+    The first request opens a window of `window_ms`; anything that arrives
+    before it closes (up to `max_batch_size`) is decoded together and each
+    caller gets its own segments back. Requests with different decode
+    options are never mixed; clips too long for one Whisper window and
+    requests needing word timestamps are decoded alone.
+
+    At most MAX_CONCURRENT_TRANSCRIPTIONS decodes (a batch counts as one)
+    are handed to the executor at a time, whoever they come from.
+    Background decodes (refinement) only take a slot that is free while
+    no live decode is waiting for one.
+    """
+
+    def __init__(self, executor, window_ms=None, max_batch_size=None, max_concurrent=None):
+        self.executor = executor
+        self.window = (window_ms if window_ms is not None else Config.BATCH_WINDOW_MS) / 1000.0
+        self.max_batch_size = max(1, max_batch_size or Config.BATCH_SIZE)
+        self.max_concurrent = max_concurrent or Config.MAX_CONCURRENT_TRANSCRIPTIONS
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._idle = None  # condition background decodes wait on for a slot nobody else wants
+        self.waiting = 0
+        self.queued = 0  # live requests handed to the batcher and not dispatched yet
+        self.background_waiting = 0
+        self.queue = None
+        self._loop = None
+        self._task = None
+        self._inflight = set()
+
+        # Batch fill statistics
+        self.batches = 0
+        self.requests = 0
+        self.size_histogram = Counter()
+
+    def start(self):
+        """Start collecting on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self._idle = asyncio.Condition()
+        self._task = self._loop.create_task(self._run())
+        logger.info(f"Batch scheduler started (window {self.window * 1000:.0f} ms, max batch {self.max_batch_size})")
+
+    def stop(self):
+        """Stop collecting; queued callers are cancelled"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        while self.queue is not None and not self.queue.empty():
+            self.queue.get_nowait().future.cancel()
+        self.queued = 0
+
+    @contextlib.asynccontextmanager
+    async def _inference_slot(self, background=False):
+        """Hold one of the global decode slots; `background` waits until no live decode wants one"""
+        if asyncio.get_running_loop() is not self._loop:
+            # The microphone thread runs its own loop; the slots belong to the server loop
+            yield
+            return
+        if background:
+            self.background_waiting += 1
+            try:
+                async with self._idle:
+                    # Live chunks still in the queue or an open batch window count as waiting too
+                    await self._idle.wait_for(
+                        lambda: self.waiting == 0 and self.queued == 0 and not self._slots.locked()
+                    )
+                # No await between the check and taking the slot, so nothing can slip in
+                await self._slots.acquire()
+            finally:
+                self.background_waiting -= 1
+        else:
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+                await self._wake_background()
+        try:
+            yield
+        finally:
+            self._slots.release()
+            await self._wake_background()
+
+    async def _wake_background(self):
+        if self.background_waiting:
+            async with self._idle:
+                self._idle.notify_all()
+
+    def _is_batchable(self, audio, options):
+        return (
+            self._task is not None
+            and self.max_batch_size > 1
+            and not options.get("word_timestamps")
+            and len(audio) <= MAX_BATCH_CLIP_SECONDS * SAMPLE_RATE
+            and asyncio.get_running_loop() is self._loop
+        )
+
+    async def transcribe(self, audio, session_id=None, model=None, background=False, **options):
+        """Queue `audio` for the next batch and wait for its segments; `model` is a ModelSpec or None for the default.
+
+        `background` decodes are never batched and yield to live ones.
+        """
+        worker = self.executor.route(session_id)
+        if background or not self._is_batchable(audio, options):
+            # Microphone thread, long clips, background work or batching disabled: decode alone
+            async with self._inference_slot(background=background):
+                return await self.executor.transcribe(audio, worker=worker, model=model, **options)
+
+        future = self._loop.create_future()
+        self.queued += 1
+        await self.queue.put(_BatchRequest(audio, options, worker, model, future))
+        return await future
+
+    async def transcribe_stream(self, audio, session_id=None, model=None, **options):
+        """Yield segments as they are decoded; batched chunks arrive all at once"""
+        if self._is_batchable(audio, options):
+            for segment in await self.transcribe(audio, session_id=session_id, model=model, **options):
+                yield segment
+            return
+        worker = self.executor.route(session_id)
+        async with self._inference_slot():
+            async for segment in self.executor.transcribe_stream(audio, worker=worker, model=model, **options):
+                yield segment
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = self._loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = defaultdict(list)
+            for request in batch:
+                # Only chunks bound for the same worker and model with the same options share a decode
+                groups[(request.worker, request.model, repr(sorted(request.options.items())))].append(request)
+
+            # Dispatch without waiting so the next window can start collecting
+            for requests in groups.values():
+                task = self._loop.create_task(self._dispatch(requests))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, requests):
+        # From here they count in `waiting` (no await in between, so background work can't slip in)
+        self.queued -= len(requests)
+        self.batches += 1
+        self.requests += len(requests)
+        self.size_histogram[len(requests)] += 1
+
+        options = requests[0].options
+        worker = requests[0].worker
+        model = requests[0].model
+        try:
+            async with self._inference_slot():
+                if len(requests) == 1:
+                    results = [await self.executor.transcribe(requests[0].audio, worker=worker, model=model, **options)]
+                else:
+                    results = await self.executor.transcribe_batch(
+                        [r.audio for r in requests], worker=worker, model=model, **options
+                    )
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        for request, segments in zip(requests, results):
+            if not request.future.done():
+                request.future.set_result(segments)
+
+    def stats(self):
+        """How full batches actually get"""
+        mean_size = self.requests / self.batches if self.batches else 0.0
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "max_concurrent": self.max_concurrent,
+            "waiting_for_slot": self.waiting,
+            "queued": self.queued,
+            "background_waiting": self.background_waiting,
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": round(mean_size, 2),
+            "mean_fill_ratio": round(mean_size / self.max_batch_size, 3),
+            "batch_size_histogram": dict(sorted(self.size_histogram.items()))
+        }
@@ -0,0 +1,131 @@
+"""SQLite checkpoints for transcription jobs, so they survive restarts"""
+
+import json
+import logging
+import sqlite3
+import threading
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+class JobStore:
+    """Persists each job and every decoded chunk as soon as it finishes.
+
+    Chunk rows hold the raw (unstitched) segments of one chunk, keyed by
+    its index and start time. Chunking is deterministic for a given file,
+    so a resumed job re-cuts the audio and only sends chunks without a row
+    to the model.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.init_database()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def init_database(self):
+        """Create the job tables if needed"""
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transcription_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    filename TEXT,
+                    path TEXT NOT NULL,
+                    language TEXT,
+                    model TEXT,
+                    status TEXT NOT NULL,
+                    created_at REAL,
+                    finished_at REAL,
+                    duration REAL,
+                    error TEXT,
+                    segments TEXT
+                )
+            ''')
+
+            # Databases from before per-job models lack the column
+            columns = [row[1] for row in cursor.execute('PRAGMA table_info(transcription_jobs)')]
+            if 'model' not in columns:
+                cursor.execute('ALTER TABLE transcription_jobs ADD COLUMN model TEXT')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transcription_job_chunks (
+                    job_id TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    start REAL NOT NULL,
+                    segments TEXT NOT NULL,
+                    PRIMARY KEY (job_id, chunk_index),
+                    FOREIGN KEY (job_id) REFERENCES transcription_jobs(job_id)
+                )
+            ''')
+
+            conn.commit()
+            conn.close()
+
+    def save_job(self, job):
+        """Insert or update a job's row"""
+        segments = json.dumps(job.segments) if job.status == "completed" else None
+        with self.lock:
+            conn = self._connect()
+            conn.execute('''
+                INSERT OR REPLACE INTO transcription_jobs
+                    (job_id, filename, path, language, model, status, created_at, finished_at, duration, error, segments)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job.job_id, job.filename, job.path, job.language, job.model, job.status, job.created_at,
+                  job.finished_at, job.duration, job.error, segments))
+            conn.commit()
+            conn.close()
+
+    def load_jobs(self) -> List[Dict[str, Any]]:
+        """All stored jobs without their segments (see `load_segments`), oldest first"""
+        with self.lock:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute('''
+                SELECT job_id, filename, path, language, model, status, created_at, finished_at, duration, error
+                FROM transcription_jobs ORDER BY created_at
+            ''').fetchall()
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def load_segments(self, job_id: str) -> List[Dict[str, Any]]:
+        """The stored transcript of a completed job"""
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute('SELECT segments FROM transcription_jobs WHERE job_id = ?', (job_id,)).fetchone()
+            conn.close()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def save_chunk(self, job_id: str, chunk_index: int, start: float, segments: list):
+        """Checkpoint one decoded chunk; `segments` are (start, end, text) relative to the chunk"""
+        with self.lock:
+            conn = self._connect()
+            conn.execute('''
+                INSERT OR REPLACE INTO transcription_job_chunks (job_id, chunk_index, start, segments)
+                VALUES (?, ?, ?, ?)
+            ''', (job_id, chunk_index, start, json.dumps(segments)))
+            conn.commit()
+            conn.close()
+
+    def load_chunks(self, job_id: str) -> Dict[int, Any]:
+        """Checkpointed chunks of a job as {chunk_index: (start, segments)}"""
+        with self.lock:
+            conn = self._connect()
+            rows = conn.execute('''
+                SELECT chunk_index, start, segments FROM transcription_job_chunks
+                WHERE job_id = ?
+            ''', (job_id,)).fetchall()
+            conn.close()
+        return {index: (start, json.loads(segments)) for index, start, segments in rows}
+
+    def delete_chunks(self, job_id: str):
+        """Drop a finished job's checkpoints once its transcript is stored"""
+        with self.lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM transcription_job_chunks WHERE job_id = ?', (job_id,))
+            conn.commit()
+            conn.close()
@@ -0,0 +1,294 @@
+"""Whisper models by size and compute type, loaded on first use and evicted LRU"""
+
+import functools
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Approximate parameter counts (millions) used to estimate a model's memory
+MODEL_PARAMS_M = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large-v1": 1550,
+    "large-v2": 1550,
+    "large-v3": 1550,
+    "distil-small.en": 166,
+    "distil-medium.en": 394,
+    "distil-large-v2": 756
+}
+
+BYTES_PER_PARAM = {
+    "float32": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int16": 2,
+    "int8": 1,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "auto": 2,
+    "default": 2
+}
+
+# A model that failed to load is not retried for this long
+LOAD_RETRY_SECONDS = 60
+
+@functools.lru_cache(maxsize=None)
+def supported_compute_types(device):
+    """Compute types CTranslate2 can run on `device` (None if CTranslate2 can't tell)"""
+    try:
+        import ctranslate2
+
+        return frozenset(ctranslate2.get_supported_compute_types(device)) | {"auto", "default"}
+    except Exception as e:
+        logger.warning(f"Could not query supported compute types for {device}: {e}")
+        return None
+
+class ModelSpec(namedtuple("ModelSpec", ["size", "compute_type"])):
+    """Which model to decode with: a size plus a CTranslate2 compute type"""
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, text, default):
+        """"small" or "small:int8" -> ModelSpec; the compute type defaults to `default`'s.
+
+        Raises ValueError for sizes outside Config.WHISPER_MODELS and unknown compute types.
+        """
+        size, _, compute_type = str(text).strip().partition(":")
+        compute_type = compute_type or default.compute_type
+        allowed = {name.strip() for name in Config.WHISPER_MODELS.split(",") if name.strip()}
+        allowed.add(default.size)
+        if size not in allowed:
+            raise ValueError(f"unknown model {size!r}, expected one of {', '.join(sorted(allowed))}")
+        if compute_type not in BYTES_PER_PARAM:
+            raise ValueError(f"unsupported compute type {compute_type!r}")
+        return cls(size, compute_type)
+
+    @property
+    def memory_mb(self):
+        params = MODEL_PARAMS_M.get(self.size.replace(".en", ""), MODEL_PARAMS_M["large-v3"])
+        return params * BYTES_PER_PARAM.get(self.compute_type, 2)
+
+    def __str__(self):
+        return f"{self.size}:{self.compute_type}"
+
+def detect_device():
+    """(device, compute_type) from WHISPER_DEVICE and WHISPER_COMPUTE_TYPE, resolving "auto".
+
+    "auto" means CUDA with float16 when CTranslate2 can see a GPU, otherwise
+    the CPU with int8; a compute type the device can't run falls back to
+    that default. Asks CTranslate2 directly instead of importing torch.
+    """
+    device = Config.DEVICE
+    supported = None
+    try:
+        import ctranslate2
+
+        if device == "auto":
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        supported = ctranslate2.get_supported_compute_types(device)
+    except Exception as e:
+        logger.warning(f"Could not query CTranslate2 devices: {e}")
+        if device == "auto":
+            device = "cpu"
+
+    default = "float16" if device == "cuda" else "int8"
+    compute_type = Config.COMPUTE_TYPE
+    if compute_type == "auto":
+        compute_type = default
+    elif supported is not None and compute_type not in supported:
+        logger.warning(f"Compute type {compute_type} is not supported on {device}, using {default}")
+        compute_type = default
+    return device, compute_type
+
+class ModelRegistry:
+    """The WhisperModels one executor (or one worker process) can decode with.
+
+    The default model from `model_kwargs` is loaded up front and never
+    evicted; neither is a model loaded with `preload`. Any other spec is loaded the first time a decode asks for it
+    (the load runs on the decoding thread, so the event loop is never
+    blocked), and the least recently used models are dropped once the
+    estimated total passes MODEL_MEMORY_BUDGET_MB. A decode still running
+    on an evicted model keeps its reference, so the memory is only freed
+    when it finishes.
+
+    `swap_default` replaces the default model while decodes keep running:
+    the new one is loaded and warmed up (with the executor's `warm_up`
+    callable) on the side and then switched in under the lock, so every
+    later `get()` sees it.
+    """
+
+    def __init__(self, model_kwargs, memory_budget_mb=None, warm_up=None):
+        self.model_kwargs = dict(model_kwargs)
+        self.warm_up = warm_up  # callable(model) run on a swapped-in model before it takes traffic
+        self.default = ModelSpec(self.model_kwargs["model_size_or_path"], self.model_kwargs["compute_type"])
+        self.memory_budget_mb = memory_budget_mb if memory_budget_mb is not None else Config.MODEL_MEMORY_BUDGET_MB
+        self._models = OrderedDict()  # spec -> WhisperModel, least recently used first
+        self._loading = {}  # spec -> lock held while it loads
+        self._lock = threading.Lock()
+        self._retired = []  # weak references to models dropped while decodes may still use them
+        self._failed = {}  # spec -> (monotonic time, error) of its last failed load
+        self.pinned = set()  # preloaded specs kept loaded like the default
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+
+    def parse(self, name):
+        """Model name -> ModelSpec this registry can run.
+
+        Raises ValueError for unknown models, compute types the device
+        doesn't support and models larger than MODEL_MEMORY_BUDGET_MB.
+        """
+        spec = ModelSpec.parse(name, self.default)
+        device = self.model_kwargs.get("device", "cpu")
+        supported = supported_compute_types(device)
+        if supported is not None and spec.compute_type not in supported:
+            raise ValueError(f"compute type {spec.compute_type!r} is not supported on {device}, "
+                             f"expected one of {', '.join(sorted(supported))}")
+        if spec.memory_mb > self.memory_budget_mb:
+            raise ValueError(f"model {spec} (~{spec.memory_mb} MB) exceeds MODEL_MEMORY_BUDGET_MB ({self.memory_budget_mb} MB)")
+        return spec
+
+    def resolve(self, name):
+        """Client-supplied model name -> ModelSpec (None means the default); ValueError if it can't be used"""
+        if not name:
+            return None
+        spec = self.parse(name)
+        if spec == self.default:
+            return None
+        # The default is never evicted, so a second model has to fit next to it
+        if spec.memory_mb + self.default.memory_mb > self.memory_budget_mb:
+            raise ValueError(f"model {spec} (~{spec.memory_mb} MB) doesn't fit in MODEL_MEMORY_BUDGET_MB "
+                             f"({self.memory_budget_mb} MB) next to the default {self.default}")
+        return spec
+
+    def _load(self, spec):
+        from faster_whisper import WhisperModel
+
+        kwargs = dict(self.model_kwargs, model_size_or_path=spec.size, compute_type=spec.compute_type)
+        return WhisperModel(**kwargs)
+
+    def get(self, spec=None):
+        """The model for `spec`, loading it if needed (blocks while it loads)"""
+        spec = spec or self.default
+        with self._lock:
+            model = self._models.get(spec)
+            if model is not None:
+                self._models.move_to_end(spec)
+                return model
+            if spec != self.default and spec.memory_mb + self.default.memory_mb > self.memory_budget_mb:
+                raise ValueError(f"model {spec} doesn't fit in MODEL_MEMORY_BUDGET_MB next to the default {self.default}")
+            self._check_failed(spec)
+            loading = self._loading.setdefault(spec, threading.Lock())
+
+        with loading:
+            with self._lock:
+                model = self._models.get(spec)
+                if model is None:
+                    self._check_failed(spec)
+            if model is not None:
+                return model
+
+            logger.info(f"Loading Whisper model {spec} (~{spec.memory_mb} MB)")
+            started = time.perf_counter()
+            try:
+                model = self._load(spec)
+            except Exception as e:
+                with self._lock:
+                    self._loading.pop(spec, None)
+                    self._failed[spec] = (time.monotonic(), str(e))
+                logger.error(f"Failed to load Whisper model {spec}: {e}")
+                raise
+            logger.info(f"Whisper model {spec} loaded in {time.perf_counter() - started:.1f}s")
+
+            with self._lock:
+                self._models[spec] = model
+                self._loading.pop(spec, None)
+                self._failed.pop(spec, None)
+                self.loads += 1
+                self._evict(keep=spec)
+        return model
+
+    def preload(self, spec):
+        """Load and warm up `spec` now and keep it loaded (blocks while it loads)"""
+        model = self.get(spec)
+        if self.warm_up is not None:
+            self.warm_up(model)
+        with self._lock:
+            self.pinned.add(spec)
+        return model
+
+    def _check_failed(self, spec):
+        # Called with the lock held: fail fast instead of retrying a broken load on every chunk
+        failed = self._failed.get(spec)
+        if failed is not None and time.monotonic() - failed[0] < LOAD_RETRY_SECONDS:
+            raise RuntimeError(f"Whisper model {spec} failed to load: {failed[1]}")
+
+    def _evict(self, keep):
+        used = sum(spec.memory_mb for spec in self._models)
+        for spec in list(self._models):
+            if used <= self.memory_budget_mb:
+                break
+            if spec in (self.default, keep) or spec in self.pinned:
+                continue
+            self._retired.append(weakref.ref(self._models.pop(spec)))
+            used -= spec.memory_mb
+            self.evictions += 1
+            logger.info(f"Evicted Whisper model {spec} (memory budget {self.memory_budget_mb} MB)")
+
+    def swap_default(self, spec):
+        """Load and warm up `spec`, then make it the default (blocks while it loads).
+
+        Swapping to the current default reloads its weights from disk.
+        Decodes already running finish on the model they started with.
+        """
+        logger.info(f"Loading Whisper model {spec} to replace {self.default}")
+        started = time.perf_counter()
+        model = self._load(spec)
+        if self.warm_up is not None:
+            self.warm_up(model)
+
+        with self._lock:
+            previous = self.default
+            for replaced in (self._models.pop(previous, None), self._models.pop(spec, None)):
+                if replaced is not None:
+                    self._retired.append(weakref.ref(replaced))
+            self._models[spec] = model
+            self.default = spec
+            self.model_kwargs.update(model_size_or_path=spec.size, compute_type=spec.compute_type)
+            self.swaps += 1
+            self._evict(keep=spec)
+        logger.info(f"Default Whisper model is now {spec} (swapped in {time.perf_counter() - started:.1f}s)")
+        return model
+
+    def draining(self):
+        """Dropped models still referenced by a running decode"""
+        with self._lock:
+            self._retired = [ref for ref in self._retired if ref() is not None]
+            return len(self._retired)
+
+    def stats(self):
+        draining = self.draining()
+        with self._lock:
+            loaded = [str(spec) for spec in self._models]
+            used = sum(spec.memory_mb for spec in self._models)
+        return {
+            "default": str(self.default),
+            "loaded": loaded,
+            "pinned": [str(spec) for spec in self.pinned],
+            "estimated_mb": used,
+            "memory_budget_mb": self.memory_budget_mb,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "swaps": self.swaps,
+            "draining": draining
+        }
@@ -0,0 +1,114 @@
+"""Per-connection writer task so a slow client never holds up transcription"""
+
+import asyncio
+import logging
+from collections import deque
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Messages where only the newest one matters; a queued one is replaced, not sent
+SUPERSEDED = {
+    "partial": ("partial", "final"),  # a partial is stale once a newer partial or the final is queued
+    "flow": ("flow",)
+}
+
+class ConnectionWriter:
+    """Bounded outbound queue drained by one sender task.
+
+    The session only ever enqueues (`send` never blocks), and the sender
+    task is the one place that awaits the socket. While a client reads
+    slowly, stale partials and flow reports are merged away; if the queue
+    still fills up with messages that can't be dropped, or a single send
+    takes longer than WS_SEND_TIMEOUT, the client is treated as gone and
+    `on_disconnect` is called so the session stops promptly.
+    """
+
+    def __init__(self, websocket, encoder, max_messages=None, on_disconnect=None):
+        self.websocket = websocket
+        self.encoder = encoder  # callable returning the connection's MessageEncoder
+        self.max_messages = max_messages or Config.WS_OUTBOUND_MAX_MESSAGES
+        self.on_disconnect = on_disconnect
+        self._messages = deque()
+        self._ready = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+        self._sending = False
+        self.failed = False
+        self.sent = 0
+        self.merged = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def send(self, message):
+        """Queue a message for the client; returns False once the client is gone"""
+        if self.failed:
+            return False
+
+        kind = message.get("type")
+        stale = [queued for queued in self._messages
+                 if queued.get("type") in SUPERSEDED and kind in SUPERSEDED[queued.get("type")]]
+        for queued in stale:
+            self._messages.remove(queued)
+        self.merged += len(stale)
+
+        if len(self._messages) >= self.max_messages:
+            self._fail(f"outbound queue full ({len(self._messages)} messages)")
+            return False
+        self._messages.append(message)
+        self._ready.set()
+        return True
+
+    def send_threadsafe(self, message):
+        """`send` from another thread (e.g. the microphone VAD loop)"""
+        self._loop.call_soon_threadsafe(self.send, message)
+
+    async def _run(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._messages:
+                    message = self._messages.popleft()
+                    self._sending = True
+                    await asyncio.wait_for(self.encoder().send(self.websocket, message), Config.WS_SEND_TIMEOUT)
+                    self._sending = False
+                    self.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._fail(f"send took longer than {Config.WS_SEND_TIMEOUT}s")
+        except Exception as e:
+            self._fail(str(e))
+
+    def _fail(self, reason):
+        if self.failed:
+            return
+        self.failed = True
+        self._messages.clear()
+        logger.warning(f"Dropping slow or disconnected client: {reason}")
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        if self.on_disconnect is not None:
+            self.on_disconnect()
+
+    async def close(self, timeout=None):
+        """Send what is still queued (up to `timeout` seconds), then stop the sender"""
+        timeout = timeout if timeout is not None else Config.WS_SEND_TIMEOUT
+        try:
+            if not self.failed:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + timeout
+                while (self._messages or self._sending) and not self._task.done() and loop.time() < deadline:
+                    await asyncio.sleep(0.01)
+        finally:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self):
+        return {"queued": len(self._messages), "sent": self.sent, "merged": self.merged, "failed": self.failed}
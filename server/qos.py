@@ -0,0 +1,186 @@
+"""Load-adaptive quality ladder shared by all live sessions"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque, namedtuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# One rung of the ladder. beam_size None means Config.LIVE_BEAM_SIZE; model None keeps the session's model.
+QualityLevel = namedtuple("QualityLevel", ["name", "beam_size", "refine", "word_timestamps", "chunk_scale", "decode", "model"])
+
+QUALITY_LEVELS = [
+    QualityLevel("full", None, True, True, 1.0, True, None),
+    QualityLevel("greedy", 1, False, True, 1.0, True, None),  # greedy live decode, no second pass
+    QualityLevel("small_model", 1, False, True, 1.0, True, Config.QOS_FALLBACK_MODEL),
+    QualityLevel("long_chunks", 1, False, False, 2.0, True, Config.QOS_FALLBACK_MODEL),  # fewer, batchable decodes
+    QualityLevel("vad_only", 1, False, False, 2.0, False, Config.QOS_FALLBACK_MODEL)  # speech activity only, no text
+]
+FULL_QUALITY = QUALITY_LEVELS[0]
+
+class QualityController:
+    """Steps every live session down the quality ladder when inference falls behind.
+
+    Each tick looks at the real-time factor of the decodes that finished
+    (time from submit to last segment over seconds of audio, so queueing
+    counts), at how long the oldest unfinished ones have been running
+    already (so a tick where nothing finished doesn't read as idle) and
+    at how many decodes are queued. Sustained overload moves
+    one rung down, sustained headroom one rung up; the hold times keep it
+    from flapping. All sessions share the level, so under load every
+    meeting gets cheaper captions instead of some getting none.
+
+    QOS_FALLBACK_MODEL is loaded and warmed up at startup (`preload`) and
+    pinned in the registry; the rungs that name it only switch sessions
+    to it once that worked, since a cold load under overload would only
+    make things worse.
+    """
+
+    def __init__(self, scheduler, executor):
+        self.scheduler = scheduler
+        self.executor = executor
+        self.index = 0
+        self.fallback = None  # preloaded ModelSpec of QOS_FALLBACK_MODEL
+        self.rtf = 0.0
+        self.queue_depth = 0
+        self.changes = 0
+        self.history = deque(maxlen=20)
+        self._task = None
+        self._audio_seconds = 0.0
+        self._decode_seconds = 0.0
+        self._inflight = {}  # token -> (monotonic start, audio seconds) of live decodes not finished yet
+        self._tokens = itertools.count()
+        self._overloaded_since = None
+        self._relaxed_since = None
+        self._level_since = time.monotonic()
+
+    @property
+    def level(self):
+        return QUALITY_LEVELS[self.index]
+
+    def start(self):
+        if not Config.QOS_ENABLED:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Quality controller started")
+
+    async def preload(self):
+        """Load and warm up QOS_FALLBACK_MODEL; on failure the cheaper rungs keep each session's model"""
+        if not Config.QOS_ENABLED or not Config.QOS_FALLBACK_MODEL:
+            return
+        models = self.executor.models
+        try:
+            fallback = models.parse(Config.QOS_FALLBACK_MODEL)
+            if fallback != models.default:
+                models.resolve(Config.QOS_FALLBACK_MODEL)  # has to fit next to the default
+                logger.info(f"Preloading QoS fallback model {fallback}")
+                await self.executor.preload(fallback)
+        except Exception as e:
+            logger.warning(f"QoS fallback model {Config.QOS_FALLBACK_MODEL} unavailable, cheaper rungs keep the session's model: {e}")
+            return
+        self.fallback = fallback
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def decode_started(self, audio_seconds):
+        """Mark a live decode as in flight; pass the token to `decode_finished` however it ends"""
+        token = next(self._tokens)
+        self._inflight[token] = (time.monotonic(), audio_seconds)
+        return token
+
+    def decode_finished(self, token):
+        self._inflight.pop(token, None)
+
+    def record_decode(self, audio_seconds, elapsed):
+        """Account one finished live decode"""
+        self._audio_seconds += audio_seconds
+        self._decode_seconds += elapsed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.QOS_INTERVAL)
+            self._tick()
+
+    def _tick(self):
+        now = time.monotonic()
+        rtf = self._decode_seconds / self._audio_seconds if self._audio_seconds > 0 else 0.0
+        # A decode still running is already at least this slow; when decodes outlast the tick this is the only signal
+        for started, seconds in list(self._inflight.values()):
+            rtf = max(rtf, (now - started) / max(seconds, Config.QOS_INTERVAL))
+        self._audio_seconds = self._decode_seconds = 0.0
+        self.rtf = 0.5 * self.rtf + 0.5 * rtf
+        queued = self.scheduler.queue.qsize() if self.scheduler.queue is not None else 0
+        self.queue_depth = queued + self.scheduler.waiting
+
+        overloaded = self.rtf > Config.QOS_STEP_DOWN_RTF or self.queue_depth > Config.QOS_STEP_DOWN_QUEUE
+        relaxed = self.rtf < Config.QOS_STEP_UP_RTF and self.queue_depth <= Config.QOS_STEP_UP_QUEUE
+        self._overloaded_since = (self._overloaded_since or now) if overloaded else None
+        self._relaxed_since = (self._relaxed_since or now) if relaxed else None
+
+        if self._overloaded_since is not None and now - self._overloaded_since >= Config.QOS_DOWN_HOLD:
+            if self.index < len(QUALITY_LEVELS) - 1:
+                self._move(self.index + 1, now)
+            self._overloaded_since = now
+        elif self._relaxed_since is not None and now - self._relaxed_since >= Config.QOS_UP_HOLD:
+            if self.index > 0:
+                self._move(self.index - 1, now)
+            self._relaxed_since = now
+
+    def _move(self, index, now):
+        previous = self.level
+        self.index = index
+        self.changes += 1
+        reason = f"rtf {self.rtf:.2f}, {self.queue_depth} decodes queued"
+        self.history.append({
+            "at": time.time(),
+            "from": previous.name,
+            "to": self.level.name,
+            "reason": reason,
+            "seconds_at_previous": round(now - self._level_since, 1)
+        })
+        self._level_since = now
+        logger.warning(f"Live quality {previous.name} -> {self.level.name} ({reason})")
+
+    def model_for(self, session):
+        """ModelSpec for a live decode: the session's own, or the preloaded fallback on the cheaper rungs if it is smaller"""
+        models = self.executor.models
+        if not session.quality.model or self.fallback is None or models is None:
+            return session.model
+        if self.fallback.memory_mb >= (session.model or models.default).memory_mb:
+            return session.model
+        return None if self.fallback == models.default else self.fallback
+
+    def update_session(self, session):
+        """Move a session to the current level; returns a "quality" message when it changed"""
+        level = self.level
+        if session.quality is level:
+            return None
+        session.quality = level
+        return {
+            "type": "quality",
+            "level": level.name,
+            "rank": self.index,
+            "levels": [q.name for q in QUALITY_LEVELS],
+            "transcribing": level.decode
+        }
+
+    def stats(self):
+        return {
+            "enabled": self._task is not None,
+            "level": self.level.name,
+            "fallback_model": str(self.fallback) if self.fallback is not None else None,
+            "rank": self.index,
+            "rtf": round(self.rtf, 3),
+            "decodes_in_flight": len(self._inflight),
+            "queue_depth": self.queue_depth,
+            "changes": self.changes,
+            "seconds_at_level": round(time.monotonic() - self._level_since, 1),
+            "history": list(self.history)
+        }
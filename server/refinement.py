@@ -0,0 +1,132 @@
+"""Background high-quality re-decode of spans that were first transcribed greedily"""
+
+import asyncio
+import logging
+
+from config import Config
+from transcription_session import format_segment
+
+logger = logging.getLogger(__name__)
+
+class _RefineJob:
+    __slots__ = ("session", "audio", "offset", "span", "segment_ids")
+
+    def __init__(self, session, audio, offset, span, segment_ids):
+        self.session = session
+        self.audio = audio
+        self.offset = offset
+        self.span = span
+        self.segment_ids = segment_ids
+
+class Refiner:
+    """Low-priority second pass over finished chunks.
+
+    Live chunks are decoded greedily for latency. Each finished chunk is
+    queued here and re-decoded with a larger beam through the scheduler as
+    a background decode, so it shares the global decode slots but only
+    takes one no live decode is waiting for. The refined text replaces the draft segments
+    in the session transcript, and a "revision" message goes to the client.
+    When the queue is full the oldest drafts simply stay as they are.
+    """
+
+    def __init__(self, scheduler, beam_size=None):
+        self.scheduler = scheduler
+        self.beam_size = beam_size or Config.REFINE_BEAM_SIZE
+        self.queue = None
+        self._task = None
+        self.refined = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        """Start refining on the running event loop"""
+        self.queue = asyncio.Queue(maxsize=Config.REFINE_QUEUE_SIZE)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Refiner started (beam {self.beam_size})")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    @property
+    def enabled(self):
+        return self._task is not None
+
+    def submit(self, session, audio, offset, span, segment_ids):
+        """Queue a decoded chunk for refinement; `span` is the (start, end] it owns on the timeline"""
+        if not self.enabled or not segment_ids:
+            return
+        if self.queue.full():
+            stale = self.queue.get_nowait()
+            stale.session.refine_pending -= 1
+            self.dropped += 1
+        session.refine_pending += 1
+        self.queue.put_nowait(_RefineJob(session, audio, offset, span, segment_ids))
+
+    async def wait_for(self, session, timeout=None):
+        """Wait until the session's queued refinements are done (or `timeout` passes)"""
+        timeout = Config.REFINE_FLUSH_TIMEOUT if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while session.refine_pending > 0 and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def _run(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._refine(job)
+                self.refined += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Refinement error: {e}")
+            finally:
+                job.session.refine_pending -= 1
+
+    async def _refine(self, job):
+        session = job.session
+        if session.closed:
+            return
+        segments = await self.scheduler.transcribe(
+            job.audio,
+            session_id=session.session_id,
+            model=session.model,
+            background=True,
+            language="en",
+            beam_size=self.beam_size,
+            temperature=0.0,
+            vad_filter=True,
+            word_timestamps=True
+        )
+
+        # Keep only the words this chunk contributed when it was stitched live
+        span_start, span_end = job.span
+        refined = []
+        for segment in segments:
+            words = [
+                word for word in (segment.words or [])
+                if span_start < job.offset + (word.start + word.end) / 2 <= span_end
+            ]
+            if words:
+                text = "".join(word.word for word in words)
+                refined.append(format_segment(text, job.offset + words[0].start, job.offset + words[-1].end))
+        if not refined:
+            return
+
+        if session.revise_segments(job.segment_ids, refined) and session.revision_callback is not None:
+            session.revision_callback({
+                "type": "revision",
+                "replaces": job.segment_ids,
+                "segments": refined
+            })
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "beam_size": self.beam_size,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "refined": self.refined,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
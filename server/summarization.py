@@ -63,50 +63,72 @@
                 
 #         return " ".join(summaries)
 
-import nltk
-from sumy.parsers.plaintext import PlaintextParser
-from sumy.nlp.tokenizers import Tokenizer
-from sumy.summarizers.lex_rank import LexRankSummarizer
-from sumy.summarizers.lsa import LsaSummarizer
-from sumy.summarizers.text_rank import TextRankSummarizer
-from sumy.nlp.stemmers import Stemmer
-from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize
 import re
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-# Ensure nltk resources are downloaded
-try:
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
+# nltk and sumy take a while to import (and nltk may download its data), so
+# both are only loaded when the first summary is requested
+
+def _ensure_nltk_resources():
+    """Download the nltk data the summarizers need if it isn't installed yet"""
+    import nltk
+
     try:
-        nltk.download('stopwords', quiet=True)
-        nltk.download('punkt', quiet=True)
-    except Exception as e:
-        logger.warning(f"Could not download nltk resources: {e}")
+        nltk.data.find('corpora/stopwords')
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        try:
+            nltk.download('stopwords', quiet=True)
+            nltk.download('punkt', quiet=True)
+        except Exception as e:
+            logger.warning(f"Could not download nltk resources: {e}")
+
+def sent_tokenize(text):
+    """nltk's sentence splitter, imported on first use"""
+    from nltk.tokenize import sent_tokenize as nltk_sent_tokenize
+
+    return nltk_sent_tokenize(text)
 
 class OfflineSummarizer:
     def __init__(self):
-        self.stemmer = Stemmer("english")
-        self.summarizers = {
-            'lsa': LsaSummarizer(self.stemmer),
-            'text_rank': TextRankSummarizer(self.stemmer),
-            'lex_rank': LexRankSummarizer(self.stemmer)
-        }
-        try:
-            self.stopwords = set(stopwords.words('english'))
-        except:
-            self.stopwords = set()
-            logger.error("Could not load stopwords, using empty set")
-        
-        # Configure summarizers
-        for name, summarizer in self.summarizers.items():
-            summarizer.stop_words = self.stopwords
-        
-        logger.info("Offline summarizer initialized with LSA, TextRank, and LexRank algorithms")
+        self.stemmer = None
+        self.summarizers = None
+        self.stopwords = set()
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        """Import nltk/sumy and build the summarizers on first use"""
+        with self._load_lock:
+            if self.summarizers is not None:
+                return
+            from sumy.summarizers.lex_rank import LexRankSummarizer
+            from sumy.summarizers.lsa import LsaSummarizer
+            from sumy.summarizers.text_rank import TextRankSummarizer
+            from sumy.nlp.stemmers import Stemmer
+            from nltk.corpus import stopwords
+
+            _ensure_nltk_resources()
+            self.stemmer = Stemmer("english")
+            summarizers = {
+                'lsa': LsaSummarizer(self.stemmer),
+                'text_rank': TextRankSummarizer(self.stemmer),
+                'lex_rank': LexRankSummarizer(self.stemmer)
+            }
+            try:
+                self.stopwords = set(stopwords.words('english'))
+            except:
+                self.stopwords = set()
+                logger.error("Could not load stopwords, using empty set")
+            
+            # Configure summarizers
+            for name, summarizer in summarizers.items():
+                summarizer.stop_words = self.stopwords
+            self.summarizers = summarizers
+            
+            logger.info("Offline summarizer initialized with LSA, TextRank, and LexRank algorithms")
     
     def _clean_text(self, text):
         """Clean and preprocess text for better summarization"""
@@ -131,6 +153,10 @@ class OfflineSummarizer:
         text = self._clean_text(text)
         
         try:
+            self._load()
+            from sumy.parsers.plaintext import PlaintextParser
+            from sumy.nlp.tokenizers import Tokenizer
+            
             # Create parser
             parser = PlaintextParser.from_string(text, Tokenizer("english"))
             
@@ -200,6 +226,7 @@ class OfflineSummarizer:
         
         # Clean text first
         text = self._clean_text(text)
+        self._load()
         sentences = sent_tokenize(text)
         
         # Split into chunks without breaking sentences
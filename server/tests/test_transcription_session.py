@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from config import Config
+from transcription_session import TranscriptionSession
+
+SAMPLE_RATE = 16000
+
+def _recording(seconds, pause_every=None, pause_seconds=0.6):
+    """Loud, steady int16 tone standing in for speech, with a silent gap every `pause_every` seconds"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = 8000 * np.sin(2 * np.pi * 180.0 * t)
+    if pause_every:
+        in_pause = (t % pause_every) >= pause_every - pause_seconds
+        audio[in_pause] = 0
+    return audio.astype(np.int16)
+
+@pytest.mark.parametrize("pause_every", [None, 8, 12, 28])
+def test_job_feed_never_drops_audio(pause_every):
+    # Same settings JobManager uses, fed in iter_pcm16's 10 s blocks
+    session = TranscriptionSession(
+        sample_rate=SAMPLE_RATE,
+        chunk_duration=Config.JOB_CHUNK_SECONDS,
+        first_chunk_duration=Config.JOB_CHUNK_SECONDS,
+        max_chunk_duration=Config.JOB_MAX_CHUNK_SECONDS
+    )
+    audio = _recording(300, pause_every)
+    block = 10 * SAMPLE_RATE
+    chunks = []
+    for start in range(0, len(audio), block):
+        chunks.extend(session.feed_chunks(audio[start:start + block]))
+    tail = session.drain()
+
+    assert session.audio_buffer.dropped == 0
+    assert chunks
+    assert max(len(chunk) for chunk in chunks) <= Config.JOB_MAX_CHUNK_SECONDS * SAMPLE_RATE
+    # Every second of the file ends up in some chunk (overlaps only add)
+    decoded = sum(len(chunk) for chunk in chunks) + (len(tail) if tail is not None else 0)
+    assert decoded >= len(audio) - session.skipped_samples
+
+@pytest.mark.parametrize("word_timestamps", [False, True])
+def test_forced_cuts_overlap_only_with_word_stitching(word_timestamps):
+    # Continuous speech never pauses, so every live cut is forced through it
+    session = TranscriptionSession(sample_rate=SAMPLE_RATE, chunk_duration=5.0)
+    session.word_timestamps = word_timestamps
+    spans = []
+    for chunk in session.feed_chunks(_recording(60)):
+        spans.append((session.chunk_start, session.chunk_start + len(chunk) / SAMPLE_RATE))
+
+    assert len(spans) > 1
+    overlap = Config.CHUNK_OVERLAP_SECONDS if word_timestamps else 0.0
+    for (_, previous_end), (start, _) in zip(spans, spans[1:]):
+        # Segment-level stitching keeps a whole first segment, so re-decoded audio would be sent twice
+        assert previous_end - start == pytest.approx(overlap, abs=1e-6)
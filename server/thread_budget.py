@@ -0,0 +1,118 @@
+"""Split the CPU cores between model replicas, summarization and I/O"""
+
+import asyncio
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Thread pools NumPy/SciPy's BLAS (and anything using OpenMP) size themselves from
+BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+def available_cores():
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 CPU quota"""
+    if Config.CPU_CORES > 0:
+        return Config.CPU_CORES
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+def limit_blas_threads(threads=None):
+    """Size the BLAS/OpenMP pools to the summarization share.
+
+    Only takes effect before NumPy is first imported, so the servers call
+    it ahead of their other imports; variables already set in the
+    environment are left alone. CTranslate2 is unaffected because it is
+    always given an explicit cpu_threads.
+    """
+    threads = threads or Config.SUMMARY_THREADS
+    for var in BLAS_THREAD_VARS:
+        os.environ.setdefault(var, str(threads))
+
+class ThreadBudget:
+    """One place that decides how many threads each CPU consumer gets.
+
+    IO_THREADS cores are left for the event loop, webrtcvad and the ffmpeg
+    decoders, SUMMARY_THREADS for summarization (BLAS in sumy's LSA), and
+    the rest is divided between the model replicas: worker processes
+    times CTranslate2 num_workers, each given cpu_threads of its own.
+    Summaries run one at a time on a dedicated thread, so sessions ending
+    together can't take more than their share from live decodes.
+    """
+
+    def __init__(self, cores=None, summary_threads=None, io_threads=None):
+        self.cores = cores or available_cores()
+        self.summary_threads = summary_threads or Config.SUMMARY_THREADS
+        self.io_threads = io_threads if io_threads is not None else Config.IO_THREADS
+        self.inference_threads = max(1, self.cores - self.summary_threads - self.io_threads)
+        self.replicas = None
+        self.threads_per_replica = None
+        self.summaries_pending = 0  # queued or running
+        self.summaries_running = 0
+        self._summaries = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+
+    def assign(self, model_kwargs, processes=1):
+        """Set cpu_threads in `model_kwargs` so all replicas together stay within the inference share"""
+        self.replicas = processes * max(1, model_kwargs.get("num_workers", 1))
+        per_replica = max(1, self.inference_threads // self.replicas)
+        if not model_kwargs.get("cpu_threads") or model_kwargs["cpu_threads"] > per_replica:
+            model_kwargs["cpu_threads"] = per_replica
+        self.threads_per_replica = model_kwargs["cpu_threads"]
+
+        # torch isn't needed by the servers, but if something pulled it in keep its pool to the summary share
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(self.summary_threads)
+
+        if self.replicas > self.inference_threads:
+            logger.warning(f"{self.replicas} model replicas on {self.inference_threads} inference cores; "
+                           f"lower WHISPER_NUM_WORKERS or WHISPER_WORKER_PROCESSES")
+        logger.info(
+            f"Thread budget: {self.cores} cores -> inference {self.replicas} x {self.threads_per_replica} threads, "
+            f"summarization {self.summary_threads}, I/O {self.io_threads}"
+        )
+
+    async def summarize(self, func, *args):
+        """Run a summarization call on the summary thread (one at a time)"""
+        loop = asyncio.get_running_loop()
+        self.summaries_pending += 1
+        try:
+            return await loop.run_in_executor(self._summaries, self._run_summary, func, *args)
+        finally:
+            self.summaries_pending -= 1
+
+    def _run_summary(self, func, *args):
+        self.summaries_running += 1
+        try:
+            return func(*args)
+        finally:
+            self.summaries_running -= 1
+
+    def stats(self):
+        return {
+            "cores": self.cores,
+            "inference": self.inference_threads,
+            "replicas": self.replicas,
+            "threads_per_replica": self.threads_per_replica,
+            "summarization": self.summary_threads,
+            "io": self.io_threads,
+            "blas_threads": os.environ.get("OMP_NUM_THREADS"),
+            "summaries_running": self.summaries_running,
+            "summaries_queued": max(0, self.summaries_pending - self.summaries_running)
+        }
+
+    def shutdown(self):
+        self._summaries.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,327 @@
+"""Asynchronous transcription jobs for uploaded recordings"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+import numpy as np
+
+from config import Config
+from inference import DecodedSegment, SAMPLE_RATE
+from job_store import JobStore
+from transcription_session import TranscriptionSession, format_segment
+
+logger = logging.getLogger(__name__)
+
+def iter_pcm16(path, sample_rate=SAMPLE_RATE, block_seconds=10.0):
+    """Decode any audio file PyAV can open to mono int16 blocks of about `block_seconds`"""
+    import av
+
+    block_samples = int(block_seconds * sample_rate)
+    resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+    pending = []
+    pending_samples = 0
+    with av.open(path, metadata_errors="ignore") as container:
+        stream = container.streams.audio[0]
+        # Decode in a background thread inside FFmpeg
+        stream.thread_type = "AUTO"
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                samples = resampled.to_ndarray().reshape(-1)
+                pending.append(samples)
+                pending_samples += len(samples)
+                if pending_samples >= block_samples:
+                    yield np.concatenate(pending)
+                    pending, pending_samples = [], 0
+        for resampled in resampler.resample(None):
+            pending.append(resampled.to_ndarray().reshape(-1))
+    if pending:
+        yield np.concatenate(pending)
+
+def probe_duration(path):
+    """Container duration in seconds, or None if the file doesn't say"""
+    import av
+
+    try:
+        with av.open(path, metadata_errors="ignore") as container:
+            if container.duration is not None:
+                return container.duration / av.time_base
+    except Exception:
+        pass
+    return None
+
+class TranscriptionJob:
+    """One uploaded recording and its progress"""
+
+    def __init__(self, path, filename, language="en", job_id=None, model=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.path = path
+        self.filename = filename
+        self.language = language
+        self.model = model  # "size:compute_type", or None for the default model
+        self.status = "queued"  # queued, running, completed, failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.duration = None
+        self.processed_seconds = 0.0
+        self.chunks = 0
+        self.segments = []  # None once a completed transcript only lives in the JobStore
+        self.error = None
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a job from its JobStore row"""
+        job = cls(row['path'], row['filename'], row['language'], job_id=row['job_id'], model=row.get('model'))
+        job.status = row['status']
+        job.created_at = row['created_at']
+        job.finished_at = row['finished_at']
+        job.duration = row['duration']
+        job.error = row['error']
+        if job.status == "completed":
+            # The transcript stays in the store until someone asks for it
+            job.segments = None
+            job.processed_seconds = job.duration or 0.0
+        return job
+
+    def to_dict(self, include_segments=True, segments=None):
+        """Status for the API; `segments` stands in for a transcript that was released to the store"""
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        result = {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "model": self.model or "default",
+            "status": self.status,
+            "duration": self.duration,
+            "processed_seconds": round(self.processed_seconds, 2),
+            "progress": round(min(1.0, self.processed_seconds / self.duration), 3) if self.duration else None,
+            "chunks": self.chunks,
+            "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+            "speed": round(self.processed_seconds / elapsed, 2) if elapsed else None,
+            "error": self.error
+        }
+        if include_segments:
+            segments = self.segments if self.segments is not None else segments or []
+            result["segments"] = segments
+            result["text"] = " ".join(seg['text'] for seg in segments)
+        return result
+
+class JobManager:
+    """Runs uploaded recordings through the shared inference backend.
+
+    The file is decoded incrementally and cut at pauses by the same session
+    logic the live stream uses, with long chunks. Up to JOB_PARALLEL_CHUNKS
+    chunks are in flight at once, so the batch scheduler and the worker pool
+    decode them side by side; results are stitched back onto one timeline
+    in chunk order as they complete.
+
+    Every decoded chunk is checkpointed in the JobStore. Jobs that were
+    queued or running when the server stopped are picked up again by
+    `start` and only decode the chunks that have no checkpoint yet.
+    The store is opened in `start` and written from a worker thread, so
+    neither importing the server nor a checkpoint touches the disk on
+    the event loop.
+    """
+
+    def __init__(self, scheduler, job_dir=None):
+        self.scheduler = scheduler
+        self.jobs = {}
+        self.job_dir = job_dir or Config.JOB_DIR
+        self.store = None
+        self._slots = None
+        self._tasks = set()
+
+    def _open_store(self):
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.store = JobStore(os.path.join(self.job_dir, "jobs.db"))
+        return self.store.load_jobs()
+
+    async def start(self):
+        """Open the job store, load stored jobs and resume the ones that never finished"""
+        self._slots = asyncio.Semaphore(Config.MAX_CONCURRENT_JOBS)
+        for row in await asyncio.to_thread(self._open_store):
+            job = TranscriptionJob.from_row(row)
+            self.jobs[job.job_id] = job
+            if job.status not in ("queued", "running"):
+                continue
+            if not os.path.exists(job.path):
+                job.status = "failed"
+                job.error = "Upload missing after restart"
+                await self._save(job)
+                continue
+            logger.info(f"Resuming transcription job {job.job_id} ({job.filename})")
+            self._schedule(job)
+
+    def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def upload_path(self, filename):
+        """Where to spool an upload before it is transcribed"""
+        suffix = os.path.splitext(filename or "")[1]
+        return os.path.join(self.job_dir, f"transcription_{uuid.uuid4().hex}{suffix}")
+
+    async def submit(self, path, filename, language="en", model=None):
+        """Queue a spooled file for transcription and return its job"""
+        job = TranscriptionJob(path, filename, language, model=model)
+        self.jobs[job.job_id] = job
+        await self._save(job)
+        self._schedule(job)
+        logger.info(f"Transcription job {job.job_id} queued ({filename})")
+        return job
+
+    def _schedule(self, job):
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def describe(self, job_id):
+        """A job's status with its segments, reading a finished transcript from the store; None if unknown"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        segments = None
+        if job.segments is None:
+            segments = await asyncio.to_thread(self.store.load_segments, job.job_id)
+        return job.to_dict(segments=segments)
+
+    async def _save(self, job):
+        await asyncio.to_thread(self.store.save_job, job)
+
+    async def _run(self, job):
+        async with self._slots:
+            job.status = "running"
+            job.started_at = time.time()
+            await self._save(job)
+            try:
+                await self._transcribe(job)
+                job.status = "completed"
+            except asyncio.CancelledError:
+                # Shutting down: keep the upload and checkpoints so the job resumes on restart.
+                # Written inline because nothing waits for this task once it is cancelled.
+                job.status = "queued"
+                self.store.save_job(job)
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                logger.error(f"Transcription job {job.job_id} failed: {e}")
+            job.finished_at = time.time()
+            await self._save(job)
+            await asyncio.to_thread(self.store.delete_chunks, job.job_id)
+            if job.status == "completed":
+                # Stored now; keeping every finished transcript in memory would grow without bound
+                job.segments = None
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+        logger.info(
+            f"Transcription job {job.job_id} {job.status}: {job.processed_seconds:.0f}s of audio "
+            f"in {job.finished_at - job.started_at:.1f}s"
+        )
+
+    async def _transcribe(self, job):
+        job.duration = await asyncio.to_thread(probe_duration, job.path)
+        session = TranscriptionSession(
+            sample_rate=SAMPLE_RATE,
+            chunk_duration=Config.JOB_CHUNK_SECONDS,
+            first_chunk_duration=Config.JOB_CHUNK_SECONDS,
+            max_chunk_duration=Config.JOB_MAX_CHUNK_SECONDS
+        )
+        # Decoded without word timestamps, so forced cuts must not overlap
+        session.word_timestamps = False
+        model = self.scheduler.executor.models.resolve(job.model)
+        in_flight = asyncio.Semaphore(Config.JOB_PARALLEL_CHUNKS)
+        checkpoints = await asyncio.to_thread(self.store.load_chunks, job.job_id)
+        decodes = []  # (chunk start, task) in timeline order
+        merged = 0
+        job.segments = []
+        job.chunks = 0
+        job.processed_seconds = 0.0
+        if checkpoints:
+            logger.info(f"Transcription job {job.job_id}: {len(checkpoints)} chunks already checkpointed")
+
+        def merge_finished():
+            """Stitch every leading chunk that has finished decoding"""
+            nonlocal merged
+            while merged < len(decodes) and decodes[merged][1].done():
+                offset, task = decodes[merged]
+                for segment in task.result():
+                    stitched = session.stitch(segment, offset)
+                    if stitched is not None:
+                        job.segments.append(format_segment(*stitched))
+                merged += 1
+
+        async def decode(index, offset, audio):
+            try:
+                segments = await self.scheduler.transcribe(
+                    audio,
+                    model=model,
+                    language=job.language,
+                    beam_size=Config.JOB_BEAM_SIZE,
+                    vad_filter=True,
+                    word_timestamps=False,
+                    without_timestamps=False,
+                    temperature=0.0
+                )
+                plain = [(segment.start, segment.end, segment.text) for segment in segments]
+                await asyncio.to_thread(self.store.save_chunk, job.job_id, index, offset, plain)
+                return segments
+            finally:
+                in_flight.release()
+                job.processed_seconds += len(audio) / SAMPLE_RATE
+
+        async def restored(segments, seconds):
+            job.processed_seconds += seconds
+            return [DecodedSegment(start, end, text, None, None) for start, end, text in segments]
+
+        async def submit(chunk):
+            index = job.chunks
+            offset = session.chunk_start
+            job.chunks += 1
+            checkpoint = checkpoints.get(index)
+            if checkpoint is not None and abs(checkpoint[0] - offset) < 1e-3:
+                # Finished before the restart: reuse it instead of decoding again
+                decodes.append((offset, asyncio.ensure_future(restored(checkpoint[1], len(chunk) / SAMPLE_RATE))))
+                return
+            # Holding a slot before reading on keeps memory bounded on long files
+            await in_flight.acquire()
+            decodes.append((offset, asyncio.ensure_future(decode(index, offset, chunk))))
+
+        blocks = iter_pcm16(job.path)
+        try:
+            while True:
+                block = await asyncio.to_thread(next, blocks, None)
+                if block is None:
+                    break
+                # A block can hold more than the ring has room for; chunks are cut as it goes in
+                for chunk in session.feed_chunks(block):
+                    await submit(chunk)
+                merge_finished()
+
+            chunk = session.drain()
+            if chunk is not None:
+                await submit(chunk)
+            await asyncio.gather(*(task for _, task in decodes))
+            merge_finished()
+        finally:
+            blocks.close()
+            for _, task in decodes:
+                task.cancel()
+
+        # Silence skipped by VAD counts as processed
+        job.processed_seconds = job.duration or (session.received_samples / SAMPLE_RATE)
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
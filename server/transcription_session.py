@@ -0,0 +1,452 @@
+"""Per-connection transcription state for the streaming endpoints"""
+
+import re
+import threading
+import time
+import itertools
+import uuid
+from collections import namedtuple
+
+import numpy as np
+import webrtcvad
+
+from audio_buffer import AudioRingBuffer, frame_energies, pcm16_to_float32
+from config import Config
+from qos import FULL_QUALITY
+from wire_format import MessageEncoder
+
+# A decoded word on the session's absolute timeline
+StreamWord = namedtuple("StreamWord", ["start", "end", "text"])
+
+def format_segment(text, start, end, speaker='Speaker'):
+    """Build the segment dict sent to clients and stored in transcripts"""
+    return {
+        'speaker': speaker,
+        'text': text.strip(),
+        'start': start,
+        'end': end,
+        'timestamp': f"{int(start//60):02d}:{int(start%60):02d}"
+    }
+
+def _normalize_word(text):
+    return re.sub(r"[^\w']", "", text.lower())
+
+class LocalAgreement:
+    """LocalAgreement-n commit policy for streaming hypotheses.
+
+    Each decode of the growing window yields a word hypothesis. Words become
+    final once the last `agreement` hypotheses share them as a common prefix;
+    everything after that prefix is still a partial guess.
+    """
+
+    def __init__(self, agreement=2):
+        self.agreement = max(1, int(agreement))
+        self.history = []
+
+    def update(self, words):
+        """Add a hypothesis; returns (committed_words, pending_words)"""
+        self.history = (self.history + [words])[-self.agreement:]
+        if len(self.history) < self.agreement:
+            return [], words
+
+        prefix = 0
+        for i, word in enumerate(words):
+            key = _normalize_word(word.text)
+            if all(i < len(h) and _normalize_word(h[i].text) == key for h in self.history):
+                prefix = i + 1
+            else:
+                break
+
+        if prefix:
+            # Later hypotheses start after the committed audio, so realign the history
+            self.history = [h[prefix:] for h in self.history]
+        return words[:prefix], words[prefix:]
+
+    def flush(self):
+        """Commit whatever the latest hypothesis says"""
+        words = self.history[-1] if self.history else []
+        self.history = []
+        return words
+
+    def reset(self):
+        self.history = []
+
+
+class TranscriptionSession:
+    """State owned by a single transcription stream.
+
+    The loaded WhisperModel is shared by every connection; the audio buffer,
+    timestamps, stitching point and transcript live here so concurrent
+    meetings never see each other's audio or text.
+    """
+
+    def __init__(self, sample_rate=16000, chunk_duration=5.0, min_chunk_duration=0.5, buffer_duration=None,
+                 first_chunk_duration=None, max_chunk_duration=None):
+        self.session_id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.sample_rate = sample_rate
+        self.chunk_duration = chunk_duration
+        self.min_chunk_duration = min_chunk_duration
+
+        # Client audio format; compressed formats get a decoder from the pool
+        self.audio_format = "pcm16"
+        self.decoder = None
+        # How results are serialized for this connection
+        self.encoder = MessageEncoder()
+        # ModelSpec this session decodes with; None means the server's default model
+        self.model = None
+
+        # Streaming audio state (int16 until a chunk is handed to the model)
+        self.first_chunk_duration = min(first_chunk_duration or Config.FIRST_CHUNK_SECONDS, chunk_duration)
+        self.max_chunk_duration = max_chunk_duration or Config.CHUNK_MAX_SECONDS
+        # The ring starts at about one chunk and only grows as far as the longest chunk or streaming window needs
+        buffer_duration = buffer_duration or chunk_duration + Config.AUDIO_RING_HEADROOM
+        max_buffer_duration = max(buffer_duration, self.max_chunk_duration, Config.STREAMING_MAX_WINDOW) + Config.AUDIO_RING_HEADROOM
+        self.audio_buffer = AudioRingBuffer(int(buffer_duration * sample_rate), int(max_buffer_duration * sample_rate))
+        self.last_chunk_end = 0.0  # Absolute end of the last emitted text (stitching point)
+        self.chunk_start = 0.0  # absolute time of the chunk last handed out
+
+        # Adaptive chunking: start short, grow up to chunk_duration while the model keeps up
+        self.chunk_target = self.first_chunk_duration
+        self.frame_samples = int(0.02 * sample_rate)
+        self.rtf = None
+
+        # Voice activity gating and how much audio it saved
+        self.vad = webrtcvad.Vad(Config.VAD_AGGRESSIVENESS) if Config.VAD_GATING else None
+        self.vad_frame_samples = int(Config.VAD_FRAME_MS * sample_rate / 1000)
+        self.received_samples = 0
+        self.skipped_samples = 0
+        self.skipped_chunks = 0
+
+        # Set by the inbound queue when the session falls behind the client
+        self.catch_up = False
+        self.degraded = False
+        # Rung of the server-wide quality ladder this session is on
+        self.quality = FULL_QUALITY
+        # Whether chunks may be decoded with word timestamps at all (file jobs turn this off)
+        self.word_timestamps = Config.WORD_TIMESTAMPS
+
+        # Streaming mode: decode the growing window and commit agreed words
+        self.streaming = Config.STREAMING_DEFAULT
+        self.partial_interval = Config.PARTIAL_INTERVAL
+        self.max_window = Config.STREAMING_MAX_WINDOW
+        self.agreement = LocalAgreement(Config.COMMIT_AGREEMENT)
+        self.window_start = 0.0  # absolute time of the first uncommitted sample
+        self._samples_since_decode = 0
+
+        # Transcript for summarization / persistence
+        self.transcript = []
+        self.transcript_lock = threading.Lock()
+        self._segment_ids = itertools.count()
+
+        # Background refinement of greedy drafts
+        self.refine_pending = 0
+        self.revision_callback = None  # callable queueing "revision" messages for the client
+        self.notify = None  # callable queueing other out-of-band messages (errors) for the client
+        self.closed = False
+
+    def reset(self):
+        """Drop buffered audio, timing and transcript"""
+        self.audio_buffer.clear()
+        self.last_chunk_end = 0.0
+        self.chunk_start = 0.0
+        self.chunk_target = self.first_chunk_duration
+        self.rtf = None
+        self.received_samples = 0
+        self.skipped_samples = 0
+        self.skipped_chunks = 0
+        self.window_start = 0.0
+        self._samples_since_decode = 0
+        self.agreement.reset()
+        with self.transcript_lock:
+            self.transcript = []
+
+    # ===== AUDIO BUFFER =====
+    def buffer_duration(self):
+        """Seconds of audio waiting to be transcribed"""
+        return len(self.audio_buffer) / self.sample_rate
+
+    def append_audio(self, pcm):
+        """Add int16 PCM samples to the buffer"""
+        dropped = self.audio_buffer.write(pcm)
+        if dropped:
+            # The oldest audio is gone: move the window so later timestamps stay on the client's clock
+            self.window_start += dropped / self.sample_rate
+        self.received_samples += len(pcm)
+        self._samples_since_decode += len(pcm)
+
+    def feed_chunks(self, pcm):
+        """Append int16 PCM a piece at a time, yielding every chunk it completes.
+
+        For sources that hand over more audio than one chunk at once (file
+        jobs): each piece only fills the buffer's free space and chunks are
+        popped in between, so nothing is dropped however the cuts fall.
+        """
+        while len(pcm):
+            room = self.audio_buffer.free
+            if room <= 0:
+                # Can't happen while the buffer holds the longest chunk; don't spin if it does
+                room = len(pcm)
+            self.append_audio(pcm[:room])
+            pcm = pcm[room:]
+            chunk = self.pop_chunk()
+            while chunk is not None:
+                yield chunk
+                chunk = self.pop_chunk()
+
+    @property
+    def stitch_words(self):
+        """Is the next chunk decoded with word timestamps, so stitching can drop words one by one?"""
+        return self.word_timestamps and self.quality.word_timestamps and not self.degraded
+
+    def free_seconds(self):
+        """Audio the buffer can still take without dropping any"""
+        return self.audio_buffer.free / self.sample_rate
+
+    def estimate_seconds(self, data):
+        """Seconds of audio in a received frame (compressed frames are estimated by the decoder)"""
+        if not data:
+            return 0.0
+        if self.decoder is None:
+            return len(data) / 2 / self.sample_rate
+        return self.decoder.estimate_seconds(len(data))
+
+    def _find_cut(self):
+        """(end sample, cut mid-speech?) for the next chunk, or None to wait for more audio.
+
+        Once `chunk_target` seconds (scaled by the quality level) are
+        buffered, the chunk ends at the last pause between CHUNK_MIN_SECONDS
+        and the end of the buffer. Without a pause we keep waiting until
+        twice the target (capped at
+        `max_chunk_duration`) and then cut at the quietest frame. While
+        catching up, the search runs to `max_chunk_duration` so the backlog
+        goes to the model in as few decodes as possible.
+        """
+        buffered = len(self.audio_buffer)
+        target = min(self.chunk_target * self.quality.chunk_scale, self.max_chunk_duration)
+        if buffered < target * self.sample_rate:
+            return None
+
+        limit_seconds = self.max_chunk_duration if self.catch_up else min(2 * target, self.max_chunk_duration)
+        limit = int(limit_seconds * self.sample_rate)
+        low = int(min(Config.CHUNK_MIN_SECONDS, self.chunk_target) * self.sample_rate) // self.frame_samples
+        energies = frame_energies(self.audio_buffer.peek(limit), self.frame_samples)[low:]
+        if not len(energies):
+            return min(buffered, limit), True
+
+        quiet = np.flatnonzero(energies <= Config.CHUNK_SILENCE_RMS ** 2)
+        if len(quiet):
+            frame, forced = quiet[-1], False
+        elif buffered >= limit:
+            frame, forced = np.argmin(energies), True
+        else:
+            return None
+        # Cut in the middle of the quiet frame
+        return int(low + frame) * self.frame_samples + self.frame_samples // 2, forced
+
+    def pop_chunk(self):
+        """Return the next chunk as float32, cut at a pause, or None if it is not ready yet"""
+        found = self._find_cut()
+        while found is not None:
+            cut, forced = found
+            pcm = self.audio_buffer.peek(cut)
+            self.chunk_start = self.window_start
+            # A cut through speech re-decodes a little audio, but only word-level stitching can drop
+            # the repeated words; a whole segment would be kept and those words sent twice
+            overlap = int(Config.CHUNK_OVERLAP_SECONDS * self.sample_rate) if forced and self.stitch_words else 0
+            consumed = max(cut - overlap, self.frame_samples)
+            if self.has_speech(pcm):
+                # The only copy: int16 window -> float32 model input
+                chunk_data = pcm16_to_float32(pcm)
+                self.advance_window(self.window_start + consumed / self.sample_rate)
+                return chunk_data
+            self.advance_window(self.window_start + consumed / self.sample_rate)
+            self._record_skip(consumed)
+            found = self._find_cut()
+        return None
+
+    def drain(self):
+        """Return whatever is left in the buffer as float32 if it is worth transcribing"""
+        remaining = None
+        self.chunk_start = self.window_start
+        pcm = self.audio_buffer.peek()
+        if self.buffer_duration() > self.min_chunk_duration:
+            if self.has_speech(pcm):
+                remaining = pcm16_to_float32(pcm)
+            else:
+                self._record_skip(len(pcm))
+        self.window_start += self.buffer_duration()
+        self.audio_buffer.clear()
+        return remaining
+
+    # ===== VOICE ACTIVITY =====
+    def has_speech(self, pcm):
+        """Does int16 `pcm` contain enough voiced frames to be worth decoding?"""
+        if self.vad is None:
+            return True
+        needed = min(Config.VAD_MIN_SPEECH_FRAMES, len(pcm) // self.vad_frame_samples)
+        if needed <= 0:
+            return False
+        voiced = 0
+        for offset in range(0, len(pcm) - self.vad_frame_samples + 1, self.vad_frame_samples):
+            frame = pcm[offset:offset + self.vad_frame_samples]
+            if self.vad.is_speech(frame.tobytes(), self.sample_rate):
+                voiced += 1
+                if voiced >= needed:
+                    return True
+        return False
+
+    def _record_skip(self, samples):
+        self.skipped_samples += samples
+        self.skipped_chunks += 1
+
+    def vad_stats(self):
+        """How much of this session's audio never reached the model"""
+        received = self.received_samples / self.sample_rate
+        skipped = self.skipped_samples / self.sample_rate
+        return {
+            "received_seconds": round(received, 2),
+            "skipped_seconds": round(skipped, 2),
+            "skipped_chunks": self.skipped_chunks,
+            "skipped_ratio": round(skipped / received, 3) if received else 0.0
+        }
+
+    def record_decode(self, audio_seconds, elapsed):
+        """Grow or shrink the chunk target based on the observed real-time factor"""
+        if audio_seconds <= 0:
+            return
+        self.rtf = elapsed / audio_seconds
+        if self.rtf < Config.CHUNK_GROW_RTF:
+            self.chunk_target = min(self.chunk_target * 1.5, self.chunk_duration)
+        elif self.rtf > Config.CHUNK_SHRINK_RTF:
+            self.chunk_target = max(self.chunk_target / 1.5, self.first_chunk_duration)
+
+    # ===== STREAMING MODE =====
+    def configure(self, options):
+        """Apply per-session settings from a client control message"""
+        if "encoding" in options:
+            self.encoder = MessageEncoder(options["encoding"])
+        if "streaming" in options:
+            self.streaming = bool(options["streaming"])
+        if "partial_interval" in options:
+            self.partial_interval = max(0.2, float(options["partial_interval"]))
+        if "commit_agreement" in options:
+            self.agreement = LocalAgreement(int(options["commit_agreement"]))
+        if "max_window" in options:
+            longest = self.audio_buffer.max_capacity / self.sample_rate - Config.AUDIO_RING_HEADROOM
+            self.max_window = min(float(options["max_window"]), longest)
+        return self.describe()
+
+    def describe(self):
+        """Current session settings, echoed back to the client"""
+        description = {
+            "type": "config",
+            "session_id": self.session_id,
+            "format": self.audio_format,
+            "model": str(self.model) if self.model is not None else "default",
+            "streaming": self.streaming,
+            "partial_interval": self.partial_interval,
+            "commit_agreement": self.agreement.agreement,
+            "max_window": self.max_window,
+            "quality": self.quality.name,
+            "vad": self.vad_stats()
+        }
+        description.update(self.encoder.describe())
+        return description
+
+    def partial_due(self):
+        """Has enough new audio arrived for another partial decode?"""
+        interval = self.partial_interval * (4 if self.catch_up else 1)
+        return self._samples_since_decode >= interval * self.sample_rate
+
+    def streaming_window(self):
+        """All uncommitted audio as float32, or None if none of it is speech"""
+        self._samples_since_decode = 0
+        pcm = self.audio_buffer.peek()
+        if not self.has_speech(pcm):
+            # Drop the silence but keep a little trailing context for a word starting at the edge
+            keep = int(self.partial_interval * self.sample_rate)
+            if len(pcm) > keep:
+                self.advance_window(self.window_start + (len(pcm) - keep) / self.sample_rate)
+                self._record_skip(len(pcm) - keep)
+            self.agreement.reset()
+            return None
+        return pcm16_to_float32(pcm)
+
+    def prompt(self, max_chars=200):
+        """Tail of the committed transcript, used as decoding context"""
+        with self.transcript_lock:
+            text = " ".join(seg['text'] for seg in self.transcript[-5:])
+        return text[-max_chars:]
+
+    def advance_window(self, end):
+        """Drop audio before absolute time `end`"""
+        samples = int(round((end - self.window_start) * self.sample_rate))
+        if samples > 0:
+            self.audio_buffer.consume(samples)
+            self.window_start += samples / self.sample_rate
+
+    def commit_words(self, words):
+        """Turn agreed words into a final transcript segment and drop their audio"""
+        segment = format_segment("".join(w.text for w in words), words[0].start, words[-1].end)
+        self.advance_window(words[-1].end)
+        self.last_chunk_end = words[-1].end
+        self.add_segments([segment])
+        return segment
+
+    # ===== STITCHING =====
+    def stitch(self, segment, offset):
+        """Place a decoded segment on the absolute timeline, dropping anything already emitted.
+
+        Words (or, without word timestamps, the whole segment) whose midpoint
+        falls before `last_chunk_end` were covered by an earlier chunk. This is
+        a constant-time check per word and never looks at the text, so
+        repeated phrases like "yes" are kept. Returns (text, start, end) or
+        None if nothing new is left.
+        """
+        if segment.words:
+            words = [
+                word for word in segment.words
+                if offset + (word.start + word.end) / 2 > self.last_chunk_end
+            ]
+            if not words:
+                return None
+            text = "".join(word.word for word in words)
+            start, end = offset + words[0].start, offset + words[-1].end
+        else:
+            start, end = offset + segment.start, offset + segment.end
+            if (start + end) / 2 <= self.last_chunk_end:
+                return None
+            text = segment.text
+
+        if not text.strip():
+            return None
+        # Don't let a segment reach back over text that was already sent
+        start = max(start, self.last_chunk_end)
+        self.last_chunk_end = max(self.last_chunk_end, end)
+        return text, start, end
+
+    # ===== TRANSCRIPT =====
+    def add_segments(self, segments):
+        """Record transcribed segments for this session, giving each an id"""
+        with self.transcript_lock:
+            for segment in segments:
+                segment.setdefault('id', next(self._segment_ids))
+            self.transcript.extend(segments)
+
+    def revise_segments(self, segment_ids, segments):
+        """Replace draft segments with refined ones; False if the drafts are gone"""
+        with self.transcript_lock:
+            positions = [i for i, seg in enumerate(self.transcript) if seg.get('id') in segment_ids]
+            if not positions:
+                return False
+            for segment in segments:
+                segment['id'] = next(self._segment_ids)
+            kept = [seg for seg in self.transcript if seg.get('id') not in segment_ids]
+            self.transcript = kept[:positions[0]] + segments + kept[positions[0]:]
+            return True
+
+    def get_transcript(self):
+        """Get the full transcript text for this session"""
+        with self.transcript_lock:
+            return " ".join(seg['text'] for seg in self.transcript)
@@ -3,31 +3,47 @@
 Local version of the whisper server using SQLite instead of MongoDB
 """
 
+import time
+_import_started = time.perf_counter()
+
+# Before NumPy loads, so its BLAS pool gets only the summarization share of the cores
+from thread_budget import ThreadBudget, limit_blas_threads
+limit_blas_threads()
+
 import asyncio
+import hmac
 import json
 import logging
 import numpy as np
-import torch
 import queue
 import threading
 import webrtcvad
-import sounddevice as sd
-import time
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Response
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Response, Request, UploadFile, File, Form
 from starlette.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from faster_whisper import WhisperModel
 import os
 import uuid
 from datetime import datetime, timezone
 from pydantic import BaseModel
 from typing import List, Optional
-from difflib import SequenceMatcher
 
 # Local imports
 from summarization import OfflineSummarizer
 from local_database import local_db
+from transcription_session import TranscriptionSession, StreamWord, format_segment
+from audio_buffer import pcm16_to_float32
+from inference import BatchScheduler, create_executor
+from refinement import Refiner
+from audio_decoder import AUDIO_FORMATS, DecoderPool
+from flow_control import InboundQueue, receive_frames
+from outbound import ConnectionWriter
+from admission import AdmissionController, TokenBucket, reject_websocket
+from qos import QualityController
+from model_registry import detect_device
+from autotune import calibrate
+from transcription_jobs import JobManager
+from config import Config
 
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="webrtcvad")
@@ -56,6 +72,9 @@ class MeetingListResponse(BaseModel):
     created_at: str
     summary: Optional[str] = None
 
+class ModelSwapRequest(BaseModel):
+    model: str  # "small", "medium:int8", ...
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -100,15 +119,43 @@ CHANNELS = 1
 
 class WhisperTranscriber:
     def __init__(self):
-        self.whisper_model = None
-        self.audio_buffer = np.array([], dtype=np.float32)
         self.sample_rate = SAMPLE_RATE
-        self.chunk_duration = 10.0
+        self.chunk_duration = 10.0  # Longest chunk target; chunks are cut at pauses
         self.min_chunk_duration = 0.5
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.compute_type = "float16" if self.device == "cuda" else "int8"
+        # Resolved when the model loads (see detect_device), so importing the server stays cheap
+        self.device = None
+        self.compute_type = None
         self.whisper_model_size = os.getenv("WHISPER_MODEL_SIZE", "base")
-        self.last_chunk_end = 0.0
+        
+        # Active streaming sessions (one per /ws/transcribe connection)
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+
+        # Decodes run in a bounded pool so the event loop stays responsive
+        self.executor = create_executor()
+        # Cores split between model replicas, summarization and I/O
+        self.threads = ThreadBudget()
+        # Chunks from all sessions are grouped into micro-batches
+        self.scheduler = BatchScheduler(self.executor)
+        # Greedy live drafts are re-decoded with a larger beam when the model is idle
+        self.refiner = Refiner(self.scheduler)
+        # Uploaded recordings share the same scheduler and workers
+        self.jobs = JobManager(self.scheduler)
+        # Warm ffmpeg processes for Opus/WebM streams
+        self.decoders = DecoderPool()
+        self.admission = AdmissionController()
+        # Steps live sessions down to cheaper decodes while inference can't keep up
+        self.qos = QualityController(self.scheduler, self.executor)
+        # Last admin-requested model swap (see start_model_swap)
+        self.model_swap = None
+        self.swap_task = None
+        # Startup progress: starting -> loading (-> calibrating) -> warming_up -> ready (or failed)
+        self.state = "starting"
+        self.startup_error = None
+        self.startup_task = None
+        self.startup_timings = {}
+        # compute_type / cpu_threads / num_workers picked by the startup calibration (AUTOTUNE_ENABLED)
+        self.tuning = None
         
         # Microphone state
         self.mic_running = False
@@ -116,152 +163,375 @@ class WhisperTranscriber:
         self.vad = webrtcvad.Vad(2)
         self.mic_thread = None
         self.vad_thread = None
-        
-        # Session state for summarization
-        self.session_transcript = []
-        self.session_lock = threading.Lock()
-        
-        # Transcription cache
-        self.transcription_cache = set()
-        self.cache_lock = threading.Lock()
-        self.cache_timestamps = {}
-        self.cache_timeout = 30
+        self.mic_session = self.create_session(register=False)
 
+    @property
+    def ready(self):
+        """True once the model is loaded and warmed up"""
+        return self.state == "ready"
+    
+    async def start(self):
+        """Load and warm up the model, tracking progress in `state` for the readiness probe"""
+        started = time.perf_counter()
+        self.startup_timings["imports"] = IMPORT_SECONDS
+        try:
+            self.state = "loading"
+            await self.initialize_models()
+            self.startup_timings["model_load"] = time.perf_counter() - started
+            if Config.WARMUP_ENABLED:
+                self.state = "warming_up"
+                warm_started = time.perf_counter()
+                await self.executor.warm_up()
+                self.startup_timings["warm_up"] = time.perf_counter() - warm_started
+            if Config.QOS_ENABLED:
+                # Cheaper rungs switch to this model under overload, so it can't be loaded then
+                fallback_started = time.perf_counter()
+                await self.qos.preload()
+                self.startup_timings["qos_fallback"] = time.perf_counter() - fallback_started
+        except Exception as e:
+            self.state = "failed"
+            self.startup_error = str(e)
+            logger.error(f"Startup failed: {e}")
+            return
+        self.state = "ready"
+        self.startup_timings["total"] = IMPORT_SECONDS + time.perf_counter() - started
+        logger.info("Ready to transcribe; startup took " + ", ".join(
+            f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_timings.items()
+        ))
+    
     async def initialize_models(self):
         """Initialize Whisper model"""
         try:
+            self.device, self.compute_type = await asyncio.to_thread(detect_device)
             logger.info(f"Loading Whisper model ({self.whisper_model_size}) on {self.device}...")
             
             # Use local models directory
             models_dir = os.path.join(os.path.dirname(__file__), "models")
-            self.whisper_model = WhisperModel(
-                self.whisper_model_size,
-                device=self.device,
-                compute_type=self.compute_type,
-                download_root=models_dir
-            )
+            model_kwargs = {
+                "model_size_or_path": self.whisper_model_size,
+                "device": self.device,
+                "compute_type": self.compute_type,
+                "download_root": models_dir,
+                "num_workers": Config.MODEL_NUM_WORKERS
+            }
+            # Worker processes split the inference cores between them
+            processes = self.executor.max_workers if self.executor.kind == "process" else 1
+            if Config.AUTOTUNE_ENABLED:
+                self.state = "calibrating"
+                started = time.perf_counter()
+                self.tuning = await asyncio.to_thread(calibrate, model_kwargs, processes, self.threads.inference_threads)
+                self.startup_timings["calibration"] = time.perf_counter() - started
+                model_kwargs.update({key: self.tuning[key] for key in ("compute_type", "cpu_threads", "num_workers")})
+                self.compute_type = self.tuning["compute_type"]
+                self.state = "loading"
+            self.threads.assign(model_kwargs, processes)
+            # The executor loads the default model (one copy per worker process in process mode);
+            # other sizes are loaded on first use
+            # Loading takes a while; keep the loop free so the health probes keep answering
+            await asyncio.to_thread(self.executor.start, model_kwargs)
+            self.scheduler.start()
+            self.qos.start()
+            if Config.REFINE_ENABLED:
+                self.refiner.start()
+            await self.jobs.start()
+            self.decoders.start()
             logger.info("Whisper model loaded successfully")
         except Exception as e:
             logger.error(f"Error initializing model: {e}")
             raise
     
+    def start_model_swap(self, spec):
+        """Start replacing the default model in the background; False if a swap is already running"""
+        if self.model_swap is not None and self.model_swap["status"] == "loading":
+            return False
+        self.model_swap = {"model": str(spec), "status": "loading", "started_at": time.time()}
+        self.swap_task = asyncio.get_running_loop().create_task(self._swap_model(spec))
+        return True
+
+    async def _swap_model(self, spec):
+        # New chunks use the new model as soon as it is switched in; decodes already
+        # running finish on the old one, which is freed when the last of them returns
+        try:
+            await self.executor.swap_model(spec)
+        except Exception as e:
+            logger.error(f"Model swap to {spec} failed: {e}")
+            self.model_swap.update(status="failed", error=str(e))
+        else:
+            self.whisper_model_size, self.compute_type = spec.size, spec.compute_type
+            self.model_swap["status"] = "completed"
+        self.model_swap["finished_at"] = time.time()
+
+    def model_status(self):
+        return {
+            "default": str(self.executor.models.default) if self.executor.models is not None else None,
+            "swap": self.model_swap,
+            "tuning": self.tuning
+        }
+
+    def create_session(self, register=True):
+        """Create per-connection state sharing this transcriber's model"""
+        session = TranscriptionSession(
+            sample_rate=self.sample_rate,
+            chunk_duration=self.chunk_duration,
+            min_chunk_duration=self.min_chunk_duration
+        )
+        if register:
+            with self.sessions_lock:
+                self.sessions[session.session_id] = session
+            self.executor.pin(session.session_id)
+            logger.info(f"Session {session.session_id} opened ({len(self.sessions)} active)")
+        return session
+    
+    def close_session(self, session):
+        """Forget a finished session"""
+        with self.sessions_lock:
+            self.sessions.pop(session.session_id, None)
+        session.closed = True
+        session.revision_callback = None
+        if session.decoder is not None:
+            self.decoders.release(session.decoder)
+            session.decoder = None
+        self.executor.release(session.session_id)
+        vad = session.vad_stats()
+        logger.info(
+            f"Session {session.session_id} closed ({len(self.sessions)} active), "
+            f"VAD skipped {vad['skipped_seconds']}s of {vad['received_seconds']}s"
+        )
+    
     def bytes_to_audio(self, audio_bytes):
-        """Convert audio bytes to numpy array"""
+        """View 16-bit PCM bytes as an int16 array (no copy)"""
         try:
-            audio_data = np.frombuffer(audio_bytes, dtype=np.int16)
-            return audio_data.astype(np.float32) / 32768.0
+            return np.frombuffer(audio_bytes, dtype=np.int16)
         except Exception as e:
             logger.error(f"Error converting audio bytes: {e}")
             return None
-
-    def is_duplicate_transcription(self, text):
-        """Check if transcription is a duplicate"""
-        with self.cache_lock:
-            current_time = time.time()
-            
-            # Clean up old cache entries
-            expired_keys = []
-            for cached_text, timestamp in self.cache_timestamps.items():
-                if current_time - timestamp > self.cache_timeout:
-                    expired_keys.append(cached_text)
-                    self.transcription_cache.discard(cached_text)
-            
-            for key in expired_keys:
-                del self.cache_timestamps[key]
-            
-            normalized_text = ' '.join(text.strip().split())
-            
-            for cached_text in self.transcription_cache:
-                if normalized_text == cached_text:
-                    self.cache_timestamps[cached_text] = current_time
-                    return True
-                
-                if normalized_text in cached_text or cached_text in normalized_text:
-                    self.cache_timestamps[cached_text] = current_time
-                    return True
-            
-            if normalized_text:
-                self.transcription_cache.add(normalized_text)
-                self.cache_timestamps[normalized_text] = current_time
-            
-            return False
-    
-    def clear_transcription_cache(self):
-        """Clear the transcription cache"""
-        with self.cache_lock:
-            self.transcription_cache.clear()
-            self.cache_timestamps.clear()
     
-    async def transcribe_audio(self, audio_data, adjust_timestamps=True):
-        """Transcribe audio with Whisper"""
+    async def transcribe_segments(self, session, audio_data, adjust_timestamps=True):
+        """Transcribe audio with Whisper, yielding each new segment as soon as it is decoded.
+
+        Live chunks are decoded greedily; the refiner re-decodes them later with a larger beam.
+        The session's quality level can lower the beam and turn off word timestamps and refinement.
+        """
+        quality = session.quality
+        started = time.perf_counter()
+        offset = session.chunk_start
+        span_start = session.last_chunk_end
+        segment_ids = []
+        # Live decodes count toward the quality controller's load even before they finish
+        decode = self.qos.decode_started(len(audio_data) / self.sample_rate) if adjust_timestamps else None
         try:
-            segments, _ = self.whisper_model.transcribe(
+            segments = self.scheduler.transcribe_stream(
                 audio_data,
+                session_id=session.session_id,
+                model=self.qos.model_for(session),
                 language="en",
-                beam_size=5,
-                vad_filter=True,
-                word_timestamps=False,
-                without_timestamps=True,
-                temperature=0.2
+                beam_size=quality.beam_size or Config.LIVE_BEAM_SIZE,
+                # A session that is behind skips Silero VAD and word alignment (and can be batched)
+                vad_filter=not session.degraded,
+                word_timestamps=session.stitch_words,
+                without_timestamps=False,
+                temperature=0.0
             )
-            
-            results = []
-            for segment in segments:
-                if not segment.text.strip():
-                    continue
-                
-                if self.is_duplicate_transcription(segment.text):
-                    continue
-                
+
+            async for segment in segments:
                 if adjust_timestamps:
-                    start = self.last_chunk_end + segment.start
-                    end = self.last_chunk_end + segment.end
-                    timestamp = f"{int(start//60):02d}:{int(start%60):02d}"
+                    # Place the segment on the session timeline and drop what an earlier chunk already covered
+                    stitched = session.stitch(segment, offset)
+                    if stitched is None:
+                        continue
+                    text, start, end = stitched
                 else:
-                    start = segment.start
-                    end = segment.end
-                    timestamp = f"{int(start//60):02d}:{int(start%60):02d}"
-                
-                results.append({
-                    'speaker': 'Speaker',
-                    'text': segment.text.strip(),
-                    'start': start,
-                    'end': end,
-                    'timestamp': timestamp
-                })
-                
-                if adjust_timestamps:
-                    self.last_chunk_end = end
-                
-            return results
-            
+                    text, start, end = segment.text, segment.start, segment.end
+                if not text.strip():
+                    continue
+
+                result = format_segment(text, start, end)
+                session.add_segments([result])
+                segment_ids.append(result['id'])
+                yield result
+
+            if adjust_timestamps:
+                elapsed = time.perf_counter() - started
+                session.record_decode(len(audio_data) / self.sample_rate, elapsed)
+                self.qos.record_decode(len(audio_data) / self.sample_rate, elapsed)
+                if quality.refine:
+                    self.refiner.submit(session, audio_data, offset, (span_start, session.last_chunk_end), segment_ids)
+
         except Exception as e:
             logger.error(f"Transcription error: {e}")
+            if session.model is not None and session.notify is not None:
+                # The model this client picked can't run here: go back to the default and say so
+                session.notify({
+                    "type": "error",
+                    "code": "model_unavailable",
+                    "model": str(session.model),
+                    "message": f"Model {session.model} failed ({e}); using the default model"
+                })
+                session.model = None
+        finally:
+            if decode is not None:
+                self.qos.decode_finished(decode)
+
+    async def chunk_messages(self, session, chunk_data, **fields):
+        """Messages for one chunk: its segments, or only a speech activity span on the "vad_only" level"""
+        if not session.quality.decode:
+            yield {
+                "type": "activity",
+                "start": round(session.chunk_start, 2),
+                "end": round(session.chunk_start + len(chunk_data) / self.sample_rate, 2),
+                **fields
+            }
+            return
+        async for segment in self.transcribe_segments(session, chunk_data):
+            yield {"type": "transcription", "segments": [segment], **fields}
+
+    async def transcribe_audio(self, session, audio_data, adjust_timestamps=True):
+        """Transcribe audio with Whisper"""
+        return [segment async for segment in self.transcribe_segments(session, audio_data, adjust_timestamps)]
+
+    async def process_audio(self, session, audio_bytes):
+        """Process audio data through the session buffer, yielding messages for the client"""
+        if session.decoder is not None:
+            # Compressed stream: hand the bytes to ffmpeg and take whatever PCM it has ready
+            await session.decoder.feed(audio_bytes)
+            pcm = session.decoder.read()
+            if pcm is None:
+                return
+            session.append_audio(pcm)
+        else:
+            pcm = self.bytes_to_audio(audio_bytes)
+            if pcm is None:
+                return
+
+            # Add to buffer
+            session.append_audio(pcm)
+
+        if session.streaming:
+            for message in await self.process_streaming(session):
+                yield message
+            return
+
+        # Process while we have full chunks, sending each segment as soon as it is decoded
+        chunk_data = session.pop_chunk()
+        while chunk_data is not None:
+            async for message in self.chunk_messages(session, chunk_data, source="websocket"):
+                yield message
+            chunk_data = session.pop_chunk()
+
+    async def process_streaming(self, session, flush=False):
+        """Decode the uncommitted window and return partial/final messages"""
+        if not flush and not session.partial_due():
             return []
 
-    async def process_audio(self, audio_bytes):
-        """Process audio data through buffer"""
-        new_audio = self.bytes_to_audio(audio_bytes)
-        if new_audio is None:
+        window = session.streaming_window()
+        if window is None:
+            # Only silence since the last commit: nothing for the model to do
             return []
-        
-        self.audio_buffer = np.concatenate((self.audio_buffer, new_audio))
-        
-        buffer_duration = len(self.audio_buffer) / self.sample_rate
-        results = []
-        
-        while buffer_duration >= self.chunk_duration:
-            chunk_samples = int(self.chunk_duration * self.sample_rate)
-            chunk_data = self.audio_buffer[:chunk_samples]
-            
-            segments = await self.transcribe_audio(chunk_data)
-            results.extend(segments)
-            
-            keep_samples = int(0.5 * self.sample_rate)
-            self.audio_buffer = self.audio_buffer[chunk_samples - keep_samples:]
-            buffer_duration = len(self.audio_buffer) / self.sample_rate
-        
-        return results
+        if not session.quality.decode:
+            # "vad_only" level: report the speech and move on without decoding it
+            start = session.window_start
+            session.agreement.reset()
+            session.advance_window(start + len(window) / self.sample_rate)
+            return [{"type": "activity", "start": round(start, 2), "end": round(session.window_start, 2)}]
+        try:
+            segments = await self.scheduler.transcribe(
+                window,
+                session_id=session.session_id,
+                model=self.qos.model_for(session),
+                language="en",
+                beam_size=1,
+                temperature=0.0,
+                vad_filter=True,
+                word_timestamps=True,
+                initial_prompt=session.prompt() or None
+            )
+        except Exception as e:
+            logger.error(f"Streaming transcription error: {e}")
+            return []
+
+        words = [
+            StreamWord(session.window_start + word.start, session.window_start + word.end, word.word)
+            for segment in segments
+            for word in (segment.words or [])
+        ]
+        if flush:
+            session.agreement.reset()
+            committed, pending = words, []
+        else:
+            committed, pending = session.agreement.update(words)
+            if not committed and session.buffer_duration() >= session.max_window:
+                # Hypotheses never settled: commit the latest one rather than grow the window forever
+                committed, pending = session.agreement.flush(), []
+
+        messages = []
+        if committed:
+            messages.append({"type": "final", "segments": [session.commit_words(committed)]})
+        elif not words and session.buffer_duration() >= session.max_window:
+            # Long stretch without speech: keep only a little trailing context
+            session.advance_window(session.window_start + session.buffer_duration() - session.partial_interval)
+        if pending:
+            partial = format_segment("".join(w.text for w in pending), pending[0].start, pending[-1].end)
+            messages.append({"type": "partial", "segments": [partial]})
+        return messages
+
+    async def finish_stream(self, session):
+        """Transcribe whatever audio is left when a stream ends, yielding messages"""
+        if session.decoder is not None:
+            # Flush the decoder; its tail may hold more than one chunk
+            pcm = await asyncio.to_thread(session.decoder.finish)
+            self.decoders.release(session.decoder)
+            session.decoder = None
+            if pcm is not None:
+                session.append_audio(pcm)
+                if not session.streaming:
+                    chunk_data = session.pop_chunk()
+                    while chunk_data is not None:
+                        async for message in self.chunk_messages(session, chunk_data, is_final=True):
+                            yield message
+                        chunk_data = session.pop_chunk()
+
+        if session.streaming:
+            if session.buffer_duration() > session.min_chunk_duration:
+                for message in await self.process_streaming(session, flush=True):
+                    yield message
+            return
+
+        remaining_audio = session.drain()
+        if remaining_audio is None:
+            return
+        async for message in self.chunk_messages(session, remaining_audio, is_final=True):
+            yield message
+
+    def configure_session(self, session, text):
+        """Apply a JSON control message to a session and return the reply"""
+        try:
+            options = json.loads(text)
+            if not isinstance(options, dict):
+                raise ValueError("expected a JSON object")
+            if "format" in options:
+                self.set_audio_format(session, options.pop("format"))
+            if "model" in options:
+                self.set_model(session, options.pop("model"))
+            return session.configure(options)
+        except (ValueError, TypeError, RuntimeError) as e:
+            return {"type": "error", "message": f"Invalid control message: {e}"}
+
+    def set_model(self, session, name):
+        """Pick the model a session decodes with ("small", "medium:int8", ...); empty means the default"""
+        session.model = self.executor.models.resolve(name)
+
+    def set_audio_format(self, session, audio_format):
+        """Negotiate the client's audio encoding; only allowed before any audio arrives"""
+        audio_format = str(audio_format).lower()
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"unsupported format {audio_format!r}, expected one of {', '.join(AUDIO_FORMATS)}")
+        if audio_format == session.audio_format:
+            return
+        if session.received_samples or session.decoder is not None:
+            raise ValueError("format must be set before sending audio")
+        if AUDIO_FORMATS[audio_format] is not None:
+            session.decoder = self.decoders.acquire(audio_format)
+        session.audio_format = audio_format
 
     # Microphone functions
     def mic_callback(self, indata, frames, time, status):
@@ -270,7 +540,7 @@ class WhisperTranscriber:
             logger.warning(f"Audio input status: {status}")
         self.mic_queue.put(bytes(indata))
 
-    async def vad_collector(self, websocket):
+    async def vad_collector(self, writer):
         """Collect and transcribe voiced audio chunks"""
         buffer = []
         voiced = False
@@ -284,20 +554,16 @@ class WhisperTranscriber:
                     buffer.append(frame)
                 elif voiced:
                     audio_chunk = b"".join(buffer)
-                    audio_np = np.frombuffer(audio_chunk, np.int16).astype(np.float32) / 32768.0
-                    
-                    segments = await self.transcribe_audio(audio_np, adjust_timestamps=False)
+                    audio_np = pcm16_to_float32(np.frombuffer(audio_chunk, np.int16))
                     
-                    if segments:
-                        with self.session_lock:
-                            self.session_transcript.extend([seg['text'] for seg in segments])
-                        
+                    async for segment in self.transcribe_segments(self.mic_session, audio_np, adjust_timestamps=False):
                         response = {
                             "type": "transcription",
-                            "segments": segments,
+                            "segments": [segment],
                             "source": "microphone"
                         }
-                        await websocket.send_text(json.dumps(response))
+                        # This loop runs in its own thread; the writer sends from the server loop
+                        writer.send_threadsafe(response)
                     
                     buffer = []
                     voiced = False
@@ -306,17 +572,18 @@ class WhisperTranscriber:
             except Exception as e:
                 logger.error(f"VAD error: {e}")
 
-    def start_microphone(self, websocket):
+    def start_microphone(self, writer):
         """Start microphone capture and VAD processing"""
         if self.mic_running:
             logger.warning("Microphone already running")
             return
         
-        with self.session_lock:
-            self.session_transcript = []
+        self.mic_session.reset()
         
         self.mic_running = True
         
+        # sounddevice loads PortAudio, so it is only imported when a microphone is used
+        import sounddevice as sd
         self.mic_thread = threading.Thread(
             target=sd.InputStream,
             kwargs={
@@ -331,7 +598,7 @@ class WhisperTranscriber:
         self.mic_thread.start()
         
         self.vad_thread = threading.Thread(
-            target=lambda: asyncio.run(self.vad_collector(websocket)),
+            target=lambda: asyncio.run(self.vad_collector(writer)),
             daemon=True
         )
         self.vad_thread.start()
@@ -344,6 +611,7 @@ class WhisperTranscriber:
             return
             
         self.mic_running = False
+        import sounddevice as sd
         sd.stop()
         
         if self.mic_thread:
@@ -357,94 +625,157 @@ class WhisperTranscriber:
         logger.info("Microphone recording stopped")
     
     def get_session_transcript(self):
-        """Get the full transcript for the current session"""
-        with self.session_lock:
-            return " ".join(self.session_transcript)
+        """Get the full transcript for the current microphone session"""
+        return self.mic_session.get_transcript()
 
 # Global instances
 transcriber = WhisperTranscriber()
 summarizer = OfflineSummarizer()
 
+# Import and module setup time, before the model starts loading (see WhisperTranscriber.start)
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 @app.on_event("startup")
 async def startup_event():
-    await transcriber.initialize_models()
+    # Load in the background: the server answers /health/live straight away and /health/ready once warmed up
+    transcriber.startup_task = asyncio.create_task(transcriber.start())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if transcriber.startup_task is not None:
+        transcriber.startup_task.cancel()
+    transcriber.scheduler.stop()
+    transcriber.refiner.stop()
+    transcriber.qos.stop()
+    transcriber.jobs.stop()
+    transcriber.decoders.shutdown()
+    transcriber.executor.shutdown()
+    transcriber.threads.shutdown()
 
 @app.websocket("/ws/transcribe")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     logger.info("WebSocket connection established")
     
-    transcriber.clear_transcription_cache()
-    transcriber.last_chunk_end = 0.0
-    transcriber.audio_buffer = np.array([], dtype=np.float32)
+    # Still loading or warming up: same answer as a full server, the client retries shortly
+    if not transcriber.ready:
+        logger.warning(f"Rejecting WebSocket connection: server not ready ({transcriber.state})")
+        await reject_websocket(websocket, retry_after=5, message="Server is starting up, try again shortly")
+        return
+    
+    # Wait briefly for a free session slot, otherwise tell the client to come back later
+    if not await transcriber.admission.acquire():
+        logger.warning("Rejecting WebSocket connection: server at capacity")
+        await reject_websocket(websocket)
+        return
+    
+    # Each connection gets its own buffer, timestamps, cache and transcript
+    session = transcriber.create_session()
+    
+    # Frames are read into a bounded queue so a slow decode never leaves them in the socket
+    inbound = InboundQueue(session)
+    reader = asyncio.create_task(receive_frames(websocket, inbound, TokenBucket()))
+    
+    # Results go out through their own task so a slow client never stalls decoding
+    writer = ConnectionWriter(
+        websocket,
+        lambda: session.encoder,
+        on_disconnect=lambda: asyncio.ensure_future(inbound.abort())
+    )
+    session.revision_callback = writer.send
+    session.notify = writer.send
     
-    session_transcript = []
+    # A model can be picked in the handshake, e.g. /ws/transcribe?model=medium:int8
+    if websocket.query_params.get("model"):
+        try:
+            transcriber.set_model(session, websocket.query_params["model"])
+        except ValueError as e:
+            writer.send({"type": "error", "message": f"Invalid model: {e}"})
     
     try:
         while True:
+            message = await inbound.get()
+            if message is None:
+                raise WebSocketDisconnect(1000)
+    
+            if message.get("text") is not None:
+                # Control messages: "stop" or a JSON settings object
+                if message["text"].strip().lower() == "stop":
+                    logger.info("Received stop command from client")
+                    break
+                reply = transcriber.configure_session(session, message["text"])
+                writer.send(reply)
+                continue
+    
+            # Tell the client how far behind we are, and pick the catch-up policy
+            flow = inbound.update_state()
+            if flow is not None:
+                writer.send(flow)
+            quality = transcriber.qos.update_session(session)
+            if quality is not None:
+                writer.send(quality)
+    
             try:
-                data = await websocket.receive_bytes()
-                segments = await transcriber.process_audio(data)
-                
-                if segments:
-                    for segment in segments:
-                        session_transcript.append(segment['text'])
-                    
-                    response = {
-                        "type": "transcription",
-                        "segments": segments,
-                        "source": "websocket"
-                    }
-                    await websocket.send_text(json.dumps(response))
+                async for response in transcriber.process_audio(session, message.get("bytes")):
+                    writer.send(response)
+            except WebSocketDisconnect:
+                raise
             except Exception as e:
                 logger.error(f"Error processing audio data: {e}")
                 break
-                
+    
+        reader.cancel()
+    
+        # Stream ended by the client: flush remaining audio, then summarize
+        async for response in transcriber.finish_stream(session):
+            writer.send(response)
+    
+        # Let the background pass finish so the summary sees the refined text
+        await transcriber.refiner.wait_for(session)
+        full_transcript = session.get_transcript()
+        if full_transcript:
+            summary = await transcriber.threads.summarize(summarizer.summarize, full_transcript)
+            response = {
+                "type": "summary",
+                "text": summary,
+                "transcript_length": len(full_transcript)
+            }
+            writer.send(response)
+        await writer.close()
+        await websocket.close()
+    
     except WebSocketDisconnect:
         logger.info("WebSocket connection closed")
-        
-        if len(transcriber.audio_buffer) / transcriber.sample_rate > transcriber.min_chunk_duration:
-            segments = await transcriber.transcribe_audio(transcriber.audio_buffer)
-            if segments:
-                for segment in segments:
-                    session_transcript.append(segment['text'])
-                
-                response = {
-                    "type": "transcription",
-                    "segments": segments,
-                    "is_final": True
-                }
-                await websocket.send_text(json.dumps(response))
-        
-        if session_transcript:
-            full_transcript = " ".join(session_transcript)
-            if full_transcript:
-                summary = summarizer.summarize(full_transcript)
-                
-                response = {
-                    "type": "summary",
-                    "text": summary,
-                    "transcript_length": len(full_transcript)
-                }
-                await websocket.send_text(json.dumps(response))
-        
-        transcriber.audio_buffer = np.array([], dtype=np.float32)
-        transcriber.last_chunk_end = 0.0
+        # Nobody to send to, but keep the tail of the meeting in the session transcript
+        async for _ in transcriber.finish_stream(session):
+            pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         await websocket.close()
-
+    finally:
+        reader.cancel()
+        await writer.close(timeout=0)
+        transcriber.close_session(session)
+        transcriber.admission.release()
+    
 @app.websocket("/ws/microphone")
 async def microphone_ws(websocket: WebSocket):
     await websocket.accept()
     logger.info("Microphone WebSocket connection established")
     
-    transcriber.clear_transcription_cache()
+    # The microphone decodes with the same model: nothing to do until it is loaded and warmed up
+    if not transcriber.ready:
+        logger.warning(f"Rejecting microphone connection: server not ready ({transcriber.state})")
+        await reject_websocket(websocket, retry_after=5, message="Server is starting up, try again shortly")
+        return
+    
+    # The VAD thread hands results to this loop; only the writer touches the socket
+    writer = ConnectionWriter(websocket, lambda: transcriber.mic_session.encoder)
     
     try:
-        transcriber.start_microphone(websocket)
+        transcriber.start_microphone(writer)
         
-        while transcriber.mic_running:
+        while transcriber.mic_running and not writer.failed:
             try:
                 message = await asyncio.wait_for(websocket.receive(), timeout=0.5)
                 
@@ -468,30 +799,140 @@ async def microphone_ws(websocket: WebSocket):
         
         full_transcript = transcriber.get_session_transcript()
         if full_transcript:
-            summary = summarizer.summarize(full_transcript)
+            summary = await transcriber.threads.summarize(summarizer.summarize, full_transcript)
             
             response = {
                 "type": "summary",
                 "text": summary,
                 "transcript_length": len(full_transcript)
             }
-            await websocket.send_text(json.dumps(response))
+            writer.send(response)
         else:
-            await websocket.send_text(json.dumps({
+            writer.send({
                 "type": "summary",
                 "text": "No transcript available for summarization"
-            }))
+            })
             
+        await writer.close()
         await websocket.close()
         logger.info("Microphone processing stopped")
 
+@app.get("/health/live")
+async def liveness(response: Response):
+    """Liveness: the process is up and its event loop answers (restart only if startup failed)"""
+    if transcriber.state == "failed":
+        response.status_code = 503
+        return {"status": "failed", "error": transcriber.startup_error}
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    """Readiness: the model is loaded and warmed up, so traffic can be routed here"""
+    if not transcriber.ready:
+        response.status_code = 503
+    return {"ready": transcriber.ready, "state": transcriber.state}
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
-        "whisper_model_loaded": transcriber.whisper_model is not None
+        "state": transcriber.state,
+        "ready": transcriber.ready,
+        "startup_error": transcriber.startup_error,
+        "startup_seconds": {phase: round(seconds, 3) for phase, seconds in transcriber.startup_timings.items()},
+        "whisper_model_loaded": transcriber.executor.ready,
+        "pending_transcriptions": transcriber.executor.pending,
+        "inference": transcriber.executor.stats(),
+        "active_sessions": len(transcriber.sessions),
+        "sessions": {session_id: session.vad_stats() for session_id, session in list(transcriber.sessions.items())},
+        "batching": transcriber.scheduler.stats(),
+        "refinement": transcriber.refiner.stats(),
+        "jobs": transcriber.jobs.stats(),
+        "decoders": transcriber.decoders.stats(),
+        "admission": transcriber.admission.stats(),
+        "quality": transcriber.qos.stats(),
+        "model": transcriber.model_status(),
+        "threads": transcriber.threads.stats()
     }
 
+# ===== TRANSCRIPTION JOB ENDPOINTS =====
+
+@app.post("/transcriptions", status_code=202)
+async def create_transcription(file: UploadFile = File(...), language: str = Form("en"), model: Optional[str] = Form(None)):
+    """Submit a recording (WAV, MP3, M4A, ...) for background transcription"""
+    if not transcriber.ready:
+        raise HTTPException(status_code=503, detail=f"Server not ready ({transcriber.state})", headers={"Retry-After": "5"})
+    try:
+        spec = transcriber.executor.models.resolve(model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if transcriber.jobs.stats().get("queued", 0) >= Config.MAX_QUEUED_JOBS:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many transcription jobs queued",
+            headers={"Retry-After": str(Config.RETRY_AFTER_SECONDS)}
+        )
+
+    # Spool the upload to disk; the job decodes it incrementally from there
+    path = transcriber.jobs.upload_path(file.filename)
+    try:
+        with open(path, "wb") as out:
+            while True:
+                block = await file.read(1024 * 1024)
+                if not block:
+                    break
+                out.write(block)
+    except Exception as e:
+        logger.error(f"Error storing upload: {e}")
+        if os.path.exists(path):
+            os.remove(path)
+        raise HTTPException(status_code=500, detail="Failed to store upload")
+
+    job = await transcriber.jobs.submit(path, file.filename, language, model=str(spec) if spec else None)
+    return job.to_dict(include_segments=False)
+
+@app.get("/transcriptions")
+async def list_transcriptions():
+    """List transcription jobs without their segments"""
+    return [job.to_dict(include_segments=False) for job in transcriber.jobs.jobs.values()]
+
+@app.get("/transcriptions/{job_id}")
+async def get_transcription(job_id: str):
+    """Status of a transcription job, with the segments decoded so far"""
+    job = await transcriber.jobs.describe(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Transcription job not found")
+    return job
+
+# ===== ADMIN ENDPOINTS =====
+
+def check_admin_token(token):
+    # Admin endpoints stay closed until a token is configured
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest(token or "", Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/model", status_code=202)
+async def swap_model(request: ModelSwapRequest, x_admin_token: Optional[str] = Header(None)):
+    """Load a new default model in the background and switch to it without dropping sessions"""
+    check_admin_token(x_admin_token)
+    if not transcriber.ready:
+        raise HTTPException(status_code=503, detail=f"Server not ready ({transcriber.state})")
+    try:
+        spec = transcriber.executor.models.parse(request.model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not transcriber.start_model_swap(spec):
+        raise HTTPException(status_code=409, detail="A model swap is already in progress")
+    return transcriber.model_status()
+
+@app.get("/admin/model")
+async def get_model_status(x_admin_token: Optional[str] = Header(None)):
+    """Current default model and the state of the last swap"""
+    check_admin_token(x_admin_token)
+    return transcriber.model_status()
+
 # ===== MEETING DATABASE ENDPOINTS =====
 
 @app.post("/meetings", response_model=MeetingResponse)
@@ -0,0 +1,82 @@
+"""Per-connection encoding of WebSocket results: JSON by default, MessagePack or CBOR on request"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ("json", "msgpack", "cbor")
+
+# Order of the fields in a compact segment array
+COMPACT_SEGMENT_FIELDS = ["id", "start_ms", "end_ms", "text", "speaker"]
+
+def compact_segment(segment):
+    """Segment dict -> [id, start_ms, end_ms, text, speaker]; the "mm:ss" string is left to the client"""
+    return [
+        segment.get('id'),
+        int(round(segment['start'] * 1000)),
+        int(round(segment['end'] * 1000)),
+        segment['text'],
+        segment.get('speaker', 'Speaker')
+    ]
+
+def compact_message(message):
+    """Replace segment dicts with compact arrays; everything else is sent as is"""
+    segments = message.get("segments")
+    if not segments:
+        return message
+    compact = dict(message)
+    compact["segments"] = [compact_segment(segment) for segment in segments]
+    return compact
+
+class MessageEncoder:
+    """Serializes outgoing messages for one connection.
+
+    JSON goes out as text frames and keeps the existing dict layout for the
+    React client. MessagePack and CBOR go out as binary frames with segments
+    packed as arrays (see COMPACT_SEGMENT_FIELDS); MessagePack reuses one
+    Packer per connection.
+    """
+
+    def __init__(self, encoding="json"):
+        encoding = str(encoding).lower()
+        if encoding not in ENCODINGS:
+            raise ValueError(f"unsupported encoding {encoding!r}, expected one of {', '.join(ENCODINGS)}")
+        self.encoding = encoding
+        self._pack = None
+
+        if encoding == "msgpack":
+            try:
+                import msgpack
+            except ImportError:
+                raise ValueError("msgpack encoding is not available (install msgpack)")
+            self._pack = msgpack.Packer(use_bin_type=True).pack
+        elif encoding == "cbor":
+            try:
+                import cbor2
+            except ImportError:
+                raise ValueError("cbor encoding is not available (install cbor2)")
+            self._pack = cbor2.dumps
+
+    @property
+    def binary(self):
+        return self._pack is not None
+
+    def encode(self, message):
+        """Message dict -> str (JSON) or bytes (MessagePack/CBOR)"""
+        if self._pack is None:
+            return json.dumps(message)
+        return self._pack(compact_message(message))
+
+    async def send(self, websocket, message):
+        data = self.encode(message)
+        if self.binary:
+            await websocket.send_bytes(data)
+        else:
+            await websocket.send_text(data)
+
+    def describe(self):
+        description = {"encoding": self.encoding}
+        if self.binary:
+            description["segment_fields"] = COMPACT_SEGMENT_FIELDS
+        return description
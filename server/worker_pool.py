@@ -0,0 +1,518 @@
+"""Multi-process Whisper worker pool with shared-memory audio hand-off"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import Config
+from inference import DecodedSegment, SAMPLE_RATE, STREAM_END, _decode, _decode_batch, warm_up
+from model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# How often the collector checks that every worker process is still running
+HEALTH_CHECK_SECONDS = 1.0
+
+def _to_plain_segment(segment):
+    """Strip a faster-whisper segment down to what the servers read"""
+    return DecodedSegment(
+        start=segment.start,
+        end=segment.end,
+        text=segment.text,
+        words=segment.words,
+        no_speech_prob=getattr(segment, "no_speech_prob", None)
+    )
+
+def _swap_model(models, spec, job_id, results):
+    """Worker-side hot swap (runs in a thread so the worker keeps decoding meanwhile)"""
+    try:
+        models.swap_default(spec)
+        results.put(("done", job_id, None))
+    except Exception as e:
+        results.put(("error", job_id, repr(e)))
+
+def _worker_main(index, model_kwargs, shm_name, num_slots, slot_samples, jobs, results, preload=()):
+    """Worker process: load private models, then decode jobs whose audio sits in shared memory"""
+    try:
+        # The parent owns (and unlinks) the block; workers only attach to it
+        shm = shared_memory.SharedMemory(name=shm_name)
+        slots = np.ndarray((num_slots, slot_samples), dtype=np.float32, buffer=shm.buf)
+
+        # Other sizes are loaded into this process the first time a job asks for them
+        models = ModelRegistry(model_kwargs, warm_up=warm_up)
+        models.get()
+    except Exception as e:
+        results.put(("failed", index, repr(e)))
+        return
+    # A respawned worker gets the models the others preloaded; without them it still serves the default
+    for spec in preload:
+        try:
+            models.preload(spec)
+        except Exception as e:
+            logger.warning(f"Whisper worker {index} could not preload {spec}: {e}")
+    results.put(("ready", index, None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, entries, options, mode, spec = job
+        if mode == "swap":
+            threading.Thread(target=_swap_model, args=(models, spec, job_id, results), daemon=True).start()
+            continue
+        try:
+            if mode == "warm":
+                warm_up(models.get())
+                results.put(("done", job_id, None))
+                continue
+            if mode == "preload":
+                models.preload(spec)
+                results.put(("done", job_id, None))
+                continue
+            model = models.get(spec)
+            # Slot views are zero-copy reads of the audio the parent wrote
+            audios = [slots[slot, :length] if slot is not None else inline for slot, length, inline in entries]
+            if mode == "batch":
+                output = _decode_batch(model, audios, options)
+            elif mode == "stream":
+                segments, _ = model.transcribe(audios[0], **options)
+                for segment in segments:
+                    results.put(("segment", job_id, _to_plain_segment(segment)))
+                output = None
+            else:
+                output = [_to_plain_segment(segment) for segment in _decode(model, audios[0], options)]
+            results.put(("done", job_id, output))
+        except Exception as e:
+            results.put(("error", job_id, repr(e)))
+
+    del slots
+    shm.close()
+
+class _Worker:
+    """Parent-side handle for one model process"""
+
+    def __init__(self, index, num_slots, slot_samples, context):
+        self.index = index
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_samples * 4)
+        self.slots = np.ndarray((num_slots, slot_samples), dtype=np.float32, buffer=self.shm.buf)
+        self.free_slots = list(range(num_slots))
+        self.slot_lock = threading.Lock()
+        self._slot_waiters = []  # (loop, future) of callers waiting for slots to come back
+        self.jobs = context.Queue()
+        self.process = None
+        self.ready = threading.Event()
+        self.error = None
+        self.available = True  # False once the process crashed more than WORKER_MAX_RESTARTS times
+        self.restarts = 0
+        self.sessions = set()
+        self.pending = 0
+
+    async def take_slots(self, count):
+        """Take `count` free slots, waiting until enough are returned"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.slot_lock:
+                if len(self.free_slots) >= count:
+                    taken = self.free_slots[:count]
+                    del self.free_slots[:count]
+                    return taken
+                waiter = (loop, loop.create_future())
+                self._slot_waiters.append(waiter)
+            try:
+                # Nothing is held while waiting, so a cancelled caller leaks no slots
+                await waiter[1]
+            finally:
+                with self.slot_lock:
+                    if waiter in self._slot_waiters:
+                        self._slot_waiters.remove(waiter)
+
+    def return_slots(self, slots):
+        """Give slots back and wake every caller waiting for them (from any thread)"""
+        with self.slot_lock:
+            self.free_slots.extend(slots)
+            waiters, self._slot_waiters = self._slot_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # Loop already closed; nobody is listening
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class _Job:
+    """A submitted decode: where its audio sits and how results get back"""
+
+    __slots__ = ("worker", "slots", "future", "loop", "queue")
+
+    def __init__(self, worker, slots, future=None, loop=None, queue=None):
+        self.worker = worker
+        self.slots = slots
+        self.future = future
+        self.loop = loop
+        self.queue = queue
+
+    def push(self, item, error=None):
+        """Hand a streamed segment (or the end marker) to the awaiting loop"""
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, (item, error))
+        except RuntimeError:
+            pass  # Loop already closed; nobody is listening
+
+class ModelWorkerPool:
+    """N processes, each with its own WhisperModel, fed through shared memory.
+
+    Audio is written once into a per-worker shared-memory slot and the worker
+    reads it in place; only slot indices and decode options cross the queue.
+    Sessions are pinned to the least-loaded worker when they open so their
+    chunks always land on the same process. Each worker keeps its own
+    ModelRegistry, so a non-default model is loaded per process on first use.
+
+    The collector thread also watches the processes. When one dies (OOM
+    kill, segfault in CTranslate2) the jobs it held fail right away and a
+    fresh process is spawned on the same shared memory; new jobs queue up
+    for it while it loads. After WORKER_MAX_RESTARTS crashes the worker is
+    marked unavailable and its sessions move to the others.
+    """
+
+    kind = "process"
+
+    def __init__(self, num_workers=None, num_slots=None, slot_seconds=None):
+        self.num_workers = max(1, num_workers or Config.MODEL_WORKER_PROCESSES)
+        self.num_slots = max(Config.BATCH_SIZE, num_slots or Config.WORKER_SLOTS)
+        self.slot_samples = int((slot_seconds or Config.WORKER_SLOT_SECONDS) * SAMPLE_RATE)
+        self.max_workers = self.num_workers
+        self.models = None
+        self.ready = False
+        self.workers = []
+        self.session_workers = {}
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._context = multiprocessing.get_context("spawn")
+        self._results = None
+        self._collector = None
+        self._model_kwargs = None
+        self._preloaded = []  # specs every worker keeps loaded, passed on to respawned processes
+
+    @property
+    def pending(self):
+        return sum(worker.pending for worker in self.workers)
+
+    def _spawn(self, worker):
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.index, self._model_kwargs, worker.shm.name, self.num_slots, self.slot_samples,
+                  worker.jobs, self._results, tuple(self._preloaded)),
+            name=f"whisper-worker-{worker.index}",
+            daemon=True
+        )
+        worker.process.start()
+
+    def start(self, model_kwargs):
+        """Spawn the workers and block until every model is loaded"""
+        model_kwargs = dict(model_kwargs)
+        # Split the cores between workers so replicas don't oversubscribe the CPU (the servers set this from their ThreadBudget)
+        model_kwargs.setdefault("cpu_threads", max(1, (os.cpu_count() or 1) // self.num_workers))
+        # Only used to resolve model names here; the models themselves live in the workers
+        self.models = ModelRegistry(model_kwargs)
+        self._model_kwargs = model_kwargs
+
+        self._results = self._context.Queue()
+        for index in range(self.num_workers):
+            worker = _Worker(index, self.num_slots, self.slot_samples, self._context)
+            self._spawn(worker)
+            self.workers.append(worker)
+
+        self._collector = threading.Thread(target=self._collect_results, name="whisper-pool-results", daemon=True)
+        self._collector.start()
+
+        for worker in self.workers:
+            worker.ready.wait()
+            if worker.error:
+                self.shutdown()
+                raise RuntimeError(f"Whisper worker {worker.index} failed to load: {worker.error}")
+
+        self.ready = True
+        logger.info(f"Model worker pool started ({self.num_workers} processes, {self.num_slots} slots each)")
+
+    # ===== SESSION ROUTING =====
+    def _usable(self):
+        usable = [worker for worker in self.workers if worker.available]
+        if not usable:
+            raise RuntimeError("No Whisper worker available (every worker process crashed)")
+        return usable
+
+    def _least_loaded(self):
+        return min(self._usable(), key=lambda w: (len(w.sessions), w.pending, w.index)).index
+
+    def pin(self, session_id):
+        """Bind a new session to the least-loaded worker"""
+        with self._lock:
+            if not self.workers:
+                return None
+            index = self._least_loaded()
+            self.workers[index].sessions.add(session_id)
+            self.session_workers[session_id] = index
+        return index
+
+    def _repin(self, session_id):
+        # Called with the lock held when a session's worker was given up on
+        self.workers[self.session_workers[session_id]].sessions.discard(session_id)
+        index = self._least_loaded()
+        self.workers[index].sessions.add(session_id)
+        self.session_workers[session_id] = index
+        return index
+
+    def release(self, session_id):
+        with self._lock:
+            index = self.session_workers.pop(session_id, None)
+            if index is not None:
+                self.workers[index].sessions.discard(session_id)
+
+    def route(self, session_id):
+        """Worker for a session; unpinned work goes to the least busy process"""
+        with self._lock:
+            index = self.session_workers.get(session_id)
+            if index is None:
+                index = min(self._usable(), key=lambda w: (w.pending, w.index)).index
+            elif not self.workers[index].available:
+                index = self._repin(session_id)
+            return index
+
+    # ===== DECODING =====
+    async def transcribe(self, audio, worker=None, model=None, **options):
+        """Decode `audio` on a worker and return the list of segments"""
+        job = await self._submit([audio], options, "single", worker, model)
+        return await asyncio.wrap_future(job.future)
+
+    async def transcribe_batch(self, audios, worker=None, model=None, **options):
+        """Decode several clips together on one worker"""
+        job = await self._submit(audios, options, "batch", worker, model)
+        return await asyncio.wrap_future(job.future)
+
+    async def transcribe_stream(self, audio, worker=None, model=None, **options):
+        """Decode `audio` on a worker, yielding each segment as the worker reports it"""
+        job = await self._submit([audio], options, "stream", worker, model)
+        while True:
+            segment, error = await job.queue.get()
+            if segment is STREAM_END:
+                if error:
+                    raise error
+                break
+            yield segment
+
+    async def _submit(self, audios, options, mode, index, model=None):
+        if not self.ready:
+            raise RuntimeError("Model worker pool not started")
+        if index is None or not self.workers[index].available:
+            index = self.route(None)
+        worker = self.workers[index]
+
+        fits = [len(audio) <= self.slot_samples for audio in audios]
+        needed = min(sum(fits), self.num_slots)
+        slots = await worker.take_slots(needed)
+
+        entries = []
+        free = iter(slots)
+        for audio, fit in zip(audios, fits):
+            slot = next(free, None) if fit else None
+            if slot is None:
+                # Too long for a slot: fall back to pickling this clip
+                entries.append((None, len(audio), np.asarray(audio, dtype=np.float32)))
+            else:
+                worker.slots[slot, :len(audio)] = audio
+                entries.append((slot, len(audio), None))
+
+        if mode == "stream":
+            job = _Job(worker, slots, loop=asyncio.get_running_loop(), queue=asyncio.Queue())
+        else:
+            job = _Job(worker, slots, future=Future())
+            # Mark running so a cancelled caller can't cancel it under the collector
+            job.future.set_running_or_notify_cancel()
+
+        job_id = next(self._job_ids)
+        with self._lock:
+            if not worker.available:
+                # Given up on while we waited for its slots
+                worker.return_slots(slots)
+                raise RuntimeError(f"Whisper worker {worker.index} is unavailable")
+            self._jobs[job_id] = job
+            worker.pending += 1
+            # Under the lock so a respawn can't swap the queue between registering and sending
+            worker.jobs.put((job_id, entries, options, mode, model))
+        return job
+
+    def _collect_results(self):
+        """Route worker messages back to the waiting callers and watch the processes (runs in a thread)"""
+        last_check = time.monotonic()
+        while True:
+            # Busy healthy workers can keep the queue full, so the check can't wait for a quiet moment
+            if time.monotonic() - last_check >= HEALTH_CHECK_SECONDS:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=HEALTH_CHECK_SECONDS)
+            except queue.Empty:
+                continue
+            if message is None:
+                break
+            kind, key, payload = message
+
+            if kind in ("ready", "failed"):
+                worker = self.workers[key]
+                worker.error = payload
+                if kind == "failed" and self.ready:
+                    # A respawned process couldn't load its model
+                    logger.error(f"Whisper worker {key} failed to load after a restart: {payload}")
+                    self._give_up(worker, RuntimeError(f"Whisper worker {key} failed to load: {payload}"))
+                elif kind == "ready" and self.ready:
+                    logger.info(f"Whisper worker {key} is back after a restart")
+                worker.ready.set()
+                continue
+
+            if kind == "segment":
+                with self._lock:
+                    job = self._jobs.get(key)
+                if job is not None:
+                    job.push(payload)
+                continue
+
+            with self._lock:
+                job = self._jobs.pop(key, None)
+                if job is None:
+                    continue
+                job.worker.pending -= 1
+            job.worker.return_slots(job.slots)
+
+            error = None
+            if kind != "done":
+                error = RuntimeError(f"Whisper worker {job.worker.index} failed: {payload}")
+            if job.queue is not None:
+                job.push(STREAM_END, error)
+            elif error:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(payload)
+
+    def _check_workers(self):
+        for worker in self.workers:
+            process = worker.process
+            if process is None or process.is_alive() or not worker.available:
+                continue
+            reason = f"exited with code {process.exitcode}"
+            if not self.ready:
+                # Died while loading: let start() report it instead of waiting forever
+                worker.error = reason
+                worker.ready.set()
+                continue
+            logger.error(f"Whisper worker {worker.index} {reason}")
+            error = RuntimeError(f"Whisper worker {worker.index} {reason}")
+            if worker.restarts >= Config.WORKER_MAX_RESTARTS:
+                self._give_up(worker, error)
+                continue
+            self._fail_jobs(worker, error)
+            worker.restarts += 1
+            worker.ready.clear()
+            with self._lock:
+                # Jobs still in the old queue were failed above; the new process starts clean
+                worker.jobs = self._context.Queue()
+                self._spawn(worker)
+            logger.info(f"Restarting Whisper worker {worker.index} (restart {worker.restarts} of {Config.WORKER_MAX_RESTARTS})")
+
+    def _give_up(self, worker, error):
+        """Stop routing to `worker` and fail what it still holds"""
+        with self._lock:
+            worker.available = False
+        self._fail_jobs(worker, error)
+        logger.error(f"Whisper worker {worker.index} marked unavailable; its sessions move to the other workers")
+
+    def _fail_jobs(self, worker, error):
+        with self._lock:
+            lost = [job_id for job_id, job in self._jobs.items() if job.worker is worker]
+            jobs = [self._jobs.pop(job_id) for job_id in lost]
+            worker.pending -= len(jobs)
+        for job in jobs:
+            worker.return_slots(job.slots)
+            if job.queue is not None:
+                job.push(STREAM_END, error)
+            else:
+                job.future.set_exception(error)
+
+    async def warm_up(self):
+        """Warm up the default model in every worker at once"""
+        jobs = [await self._submit([], {}, "warm", worker.index) for worker in self.workers if worker.available]
+        await asyncio.gather(*(asyncio.wrap_future(job.future) for job in jobs))
+
+    async def preload(self, spec):
+        """Load and warm up a non-default model in every worker and keep it loaded"""
+        if spec not in self._preloaded:
+            self._preloaded.append(spec)
+        jobs = [await self._submit([], {}, "preload", worker.index, spec) for worker in self.workers if worker.available]
+        await asyncio.gather(*(asyncio.wrap_future(job.future) for job in jobs))
+
+    async def swap_model(self, spec):
+        """Hot-swap the default model in every worker, one process at a time"""
+        # Processes respawned from here on load the new model
+        self._model_kwargs = dict(self._model_kwargs, model_size_or_path=spec.size, compute_type=spec.compute_type)
+        for worker in list(self.workers):
+            if not worker.available:
+                continue
+            job = await self._submit([], {}, "swap", worker.index, spec)
+            await asyncio.wrap_future(job.future)
+            logger.info(f"Whisper worker {worker.index} switched to {spec}")
+        self.models = ModelRegistry(self._model_kwargs)
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "pending": self.pending,
+            "workers": [
+                {
+                    "worker": worker.index,
+                    "alive": worker.process is not None and worker.process.is_alive(),
+                    "available": worker.available,
+                    "restarts": worker.restarts,
+                    "sessions": len(worker.sessions),
+                    "pending": worker.pending,
+                    "free_slots": len(worker.free_slots)
+                }
+                for worker in self.workers
+            ]
+        }
+
+    def shutdown(self):
+        """Stop the workers and free the shared memory"""
+        self.ready = False
+        for worker in self.workers:
+            worker.jobs.put(None)
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5.0)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            worker.slots = None
+            worker.shm.close()
+            worker.shm.unlink()
+        if self._results is not None:
+            self._results.put(None)
+        with self._lock:
+            for job in self._jobs.values():
+                error = RuntimeError("Model worker pool shut down")
+                if job.queue is not None:
+                    job.push(STREAM_END, error)
+                else:
+                    job.future.set_exception(error)
+            self._jobs.clear()
+        self.workers = []
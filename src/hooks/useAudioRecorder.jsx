@@ -194,6 +194,16 @@ const useAudioRecorder = (onTranscriptUpdate, onSummaryReceived) => {
           if (onSummaryReceived) {
             onSummaryReceived(summary);
           }
+        },
+        (replacedIds, refinedSegments) => {
+          // Put the refined segments where the first draft they replace was
+          onTranscriptUpdate(prev => {
+            const replaced = new Set(replacedIds);
+            const position = prev.findIndex(segment => replaced.has(segment.serverId));
+            if (position === -1) return prev;
+            const kept = prev.filter(segment => !replaced.has(segment.serverId));
+            return [...kept.slice(0, position), ...refinedSegments, ...kept.slice(position)];
+          });
         }
       );
 
@@ -1,12 +1,13 @@
 import { formatTime } from '@/lib/utils';
 
 export class WhisperWebSocketClient {
-  constructor(onTranscriptSegment, onError, onConnectionChange, onSummaryReceived) {
+  constructor(onTranscriptSegment, onError, onConnectionChange, onSummaryReceived, onTranscriptRevision) {
     this.ws = null;
     this.onTranscriptSegment = onTranscriptSegment;
     this.onError = onError;
     this.onConnectionChange = onConnectionChange;
     this.onSummaryReceived = onSummaryReceived; // New callback for summary
+    this.onTranscriptRevision = onTranscriptRevision; // Refined text replacing earlier segments
     this.isConnected = false;
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 5;
@@ -34,19 +35,11 @@ export class WhisperWebSocketClient {
           if (data.type === 'transcription' && data.segments) {
             // Process each segment from Whisper
             data.segments.forEach(segment => {
-              // Create a unique identifier based on text content and timing to prevent duplicates
-              const segmentId = `whisper-${segment.start}-${segment.end}-${segment.text.substring(0, 20)}`;
-              const transcriptSegment = {
-                id: segmentId,
-                speaker: segment.speaker,
-                text: segment.text,
-                timestamp: segment.timestamp,
-                start: segment.start,
-                end: segment.end
-              };
-              
-              this.onTranscriptSegment(transcriptSegment);
+              this.onTranscriptSegment(this.toTranscriptSegment(segment));
             });
+          } else if (data.type === 'revision' && data.segments) {
+            // The server re-decoded earlier segments with a larger beam: swap them for the refined text
+            this.onTranscriptRevision?.(data.replaces, data.segments.map(segment => this.toTranscriptSegment(segment)));
           } else if (data.type === 'summary' && this.onSummaryReceived) {
             // Handle summary message
             this.onSummaryReceived(data.text);
@@ -79,6 +72,20 @@ export class WhisperWebSocketClient {
     }
   }
 
+  toTranscriptSegment(segment) {
+    // Create a unique identifier based on text content and timing to prevent duplicates
+    const segmentId = `whisper-${segment.start}-${segment.end}-${segment.text.substring(0, 20)}`;
+    return {
+      id: segmentId,
+      serverId: segment.id, // what "revision" messages refer to
+      speaker: segment.speaker,
+      text: segment.text,
+      timestamp: segment.timestamp,
+      start: segment.start,
+      end: segment.end
+    };
+  }
+
   scheduleReconnect() {
     this.reconnectAttempts++;
     const delay = this.reconnectDelay * Math.pow(2, this.reconnectAttempts - 1);
@@ -208,8 +215,8 @@ export class AudioProcessor {
 }
 
 // Initialize Whisper WebSocket connection
-export const initializeWhisperConnection = (onTranscriptSegment, onError, onConnectionChange, onSummaryReceived) => {
-  const client = new WhisperWebSocketClient(onTranscriptSegment, onError, onConnectionChange, onSummaryReceived);
+export const initializeWhisperConnection = (onTranscriptSegment, onError, onConnectionChange, onSummaryReceived, onTranscriptRevision) => {
+  const client = new WhisperWebSocketClient(onTranscriptSegment, onError, onConnectionChange, onSummaryReceived, onTranscriptRevision);
   client.connect();
   return client;
 };